@@ -0,0 +1,440 @@
+"""Monte Carlo and exact equity for Texas Hold'em hands.
+
+Rollouts deal the rest of the board at random from the `gameplay` deck and
+score every player's best 5 of 7 cards with `evaluator.evaluate_best`.
+Batches of rollouts run across a process pool in waves, and sampling
+stops as soon as every player's equity has reached the target standard
+error, or the rollout or time budget runs out. `aiter_monte_carlo` does
+the same from a coroutine, for the async views.
+
+`exact_equity` instead enumerates every runout, scoring each class of
+runouts that are equivalent up to suit once and weighting it by size.
+"""
+
+import asyncio
+import itertools
+import math
+import os
+import random
+import time
+from collections.abc import AsyncIterator
+from collections.abc import Iterator
+from collections.abc import Sequence
+from concurrent.futures import Executor
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import django
+
+from gameplay import deck_codes
+from hand_ranker import evaluator
+
+BATCH_SIZE = 2_000
+TARGET_STDERR = 0.002
+TIME_BUDGET = 5.0
+MAX_ROLLOUTS = 1_000_000
+
+Z_95 = 1.96
+
+
+@dataclass
+class PlayerEquity:
+    rollouts: int
+    wins: int
+    ties: int
+    # sum and sum of squares of each rollout's pot share
+    shares: float
+    shares_squared: float
+    exact: bool = False
+
+    @property
+    def losses(self) -> int:
+        return self.rollouts - self.wins - self.ties
+
+    @property
+    def win(self) -> float:
+        return self.wins / self.rollouts
+
+    @property
+    def tie(self) -> float:
+        return self.ties / self.rollouts
+
+    @property
+    def loss(self) -> float:
+        return self.losses / self.rollouts
+
+    @property
+    def equity(self) -> float:
+        return self.shares / self.rollouts
+
+    @property
+    def stderr(self) -> float:
+        if self.exact:
+            return 0.0
+        variance = self.shares_squared / self.rollouts - self.equity**2
+        return math.sqrt(max(variance, 0.0) / self.rollouts)
+
+    def interval(self, p: float, z: float = Z_95) -> tuple[float, float]:
+        """Normal approximation confidence interval for the proportion p."""
+        if self.exact:
+            return p, p
+        margin = z * math.sqrt(p * (1 - p) / self.rollouts)
+        return max(p - margin, 0.0), min(p + margin, 1.0)
+
+    def as_dict(self) -> dict:
+        return {
+            "win": self.win,
+            "tie": self.tie,
+            "loss": self.loss,
+            "equity": self.equity,
+            "stderr": self.stderr,
+            "win_interval": self.interval(self.win),
+            "tie_interval": self.interval(self.tie),
+            "loss_interval": self.interval(self.loss),
+            "equity_interval": (
+                self.equity - Z_95 * self.stderr,
+                self.equity + Z_95 * self.stderr,
+            ),
+        }
+
+
+@dataclass
+class EquityResult:
+    players: list[PlayerEquity]
+    rollouts: int
+    elapsed: float
+    converged: bool
+
+    @property
+    def stderr(self) -> float:
+        return max(player.stderr for player in self.players)
+
+    def as_dict(self) -> dict:
+        return {
+            "players": [player.as_dict() for player in self.players],
+            "rollouts": self.rollouts,
+            "elapsed": self.elapsed,
+            "converged": self.converged,
+        }
+
+
+class EquityAccumulator:
+
+    def __init__(self, players: int):
+        self.players = [
+            PlayerEquity(0, 0, 0, 0.0, 0.0) for _ in range(players)
+        ]
+        self.rollouts = 0
+
+    def add(self, batch: "RolloutBatch"):
+        rollouts, wins, ties, shares, shares_squared = batch
+        self.rollouts += rollouts
+        for i, player in enumerate(self.players):
+            player.rollouts += rollouts
+            player.wins += wins[i]
+            player.ties += ties[i]
+            player.shares += shares[i]
+            player.shares_squared += shares_squared[i]
+
+    @property
+    def stderr(self) -> float:
+        if not self.rollouts:
+            return math.inf
+        return max(player.stderr for player in self.players)
+
+    def result(self, elapsed: float, converged: bool) -> EquityResult:
+        players = [PlayerEquity(**vars(player)) for player in self.players]
+        return EquityResult(players, self.rollouts, elapsed, converged)
+
+
+# rollouts, then per player wins, ties, shares and shares squared
+RolloutBatch = tuple[int, list[int], list[int], list[float], list[float]]
+
+
+def rollout_batch(
+    hands: Sequence[Sequence[int]],
+    board: Sequence[int],
+    live: Sequence[int],
+    rollouts: int,
+    seed: int,
+) -> RolloutBatch:
+    rng = random.Random(seed)
+    evaluate_best = evaluator.evaluate_best
+    hands = [list(hand) for hand in hands]
+    board = list(board)
+    missing = 5 - len(board)
+    wins = [0] * len(hands)
+    ties = [0] * len(hands)
+    shares = [0.0] * len(hands)
+    shares_squared = [0.0] * len(hands)
+    for _ in range(rollouts):
+        runout = board + rng.sample(live, missing)
+        ranks = [evaluate_best(hand + runout) for hand in hands]
+        best = max(ranks)
+        winners = [i for i, rank in enumerate(ranks) if rank == best]
+        share = 1 / len(winners)
+        for i in winners:
+            if share == 1:
+                wins[i] += 1
+            else:
+                ties[i] += 1
+            shares[i] += share
+            shares_squared[i] += share * share
+    return rollouts, wins, ties, shares, shares_squared
+
+
+def init_worker():
+    django.setup()
+    # build the 7-card tables once per worker
+    evaluator.warm_up()
+
+
+def live_cards(
+    hands: Sequence[Sequence[int]], board: Sequence[int]
+) -> list[int]:
+    known = [card for hand in hands for card in hand] + list(board)
+    if len(set(known)) != len(known):
+        raise ValueError("The same card was dealt twice")
+    if len(hands) < 2 or any(len(hand) != 2 for hand in hands):
+        raise ValueError("Equity needs two hole cards for at least 2 players")
+    if len(board) > 5:
+        raise ValueError("The board has at most 5 cards")
+    live = [card for card in deck_codes() if card not in known]
+    if len(live) < 5 - len(board):
+        raise ValueError("Too few cards are left to finish the board")
+    return live
+
+
+def _check_options(workers: int, batch_size: int, max_rollouts: int):
+    # any of these at 0 would leave no rollouts to estimate from
+    for name, value in (
+        ("workers", workers),
+        ("batch_size", batch_size),
+        ("max_rollouts", max_rollouts),
+    ):
+        if value < 1:
+            raise ValueError(f"{name} must be at least 1, not {value}")
+
+
+def _wave(
+    rng: random.Random, remaining: int, workers: int, batch_size: int
+) -> list[tuple[int, int]]:
+    """(rollouts, seed) of each batch in the next wave."""
+    sizes = [
+        min(batch_size, remaining - i * batch_size) for i in range(workers)
+    ]
+    return [(size, rng.getrandbits(64)) for size in sizes if size > 0]
+
+
+def _progress(
+    accumulator: EquityAccumulator,
+    start: float,
+    target_stderr: float,
+    time_budget: float,
+    max_rollouts: int,
+) -> tuple[EquityResult, bool]:
+    """The running result and whether sampling should stop."""
+    elapsed = time.perf_counter() - start
+    converged = accumulator.stderr <= target_stderr
+    done = (
+        converged
+        or accumulator.rollouts >= max_rollouts
+        or elapsed >= time_budget
+    )
+    return accumulator.result(elapsed, converged), done
+
+
+def iter_monte_carlo(
+    hands: Sequence[Sequence[int]],
+    board: Sequence[int],
+    executor: Executor,
+    workers: int = 1,
+    batch_size: int = BATCH_SIZE,
+    target_stderr: float = TARGET_STDERR,
+    time_budget: float = TIME_BUDGET,
+    max_rollouts: int = MAX_ROLLOUTS,
+    seed: int | None = None,
+) -> Iterator[EquityResult]:
+    """Yield the running estimate after every wave of `workers` batches run
+    on `executor`; the last result yielded is final. The time budget is
+    checked between waves."""
+    _check_options(workers, batch_size, max_rollouts)
+    live = live_cards(hands, board)
+    rng = random.Random(seed)
+    accumulator = EquityAccumulator(len(hands))
+    start = time.perf_counter()
+    while True:
+        remaining = max_rollouts - accumulator.rollouts
+        futures = [
+            executor.submit(
+                rollout_batch, hands, board, live, size, batch_seed
+            )
+            for size, batch_seed in _wave(rng, remaining, workers, batch_size)
+        ]
+        for future in futures:
+            accumulator.add(future.result())
+        result, done = _progress(
+            accumulator, start, target_stderr, time_budget, max_rollouts
+        )
+        yield result
+        if done:
+            return
+
+
+async def aiter_monte_carlo(
+    hands: Sequence[Sequence[int]],
+    board: Sequence[int],
+    executor: Executor,
+    workers: int = 1,
+    batch_size: int = BATCH_SIZE,
+    target_stderr: float = TARGET_STDERR,
+    time_budget: float = TIME_BUDGET,
+    max_rollouts: int = MAX_ROLLOUTS,
+    seed: int | None = None,
+) -> AsyncIterator[EquityResult]:
+    """`iter_monte_carlo` for asyncio: each wave is awaited through the
+    running event loop instead of blocking it. Cancelling the consuming
+    task cancels the wave's batches that have not started yet."""
+    _check_options(workers, batch_size, max_rollouts)
+    live = live_cards(hands, board)
+    rng = random.Random(seed)
+    accumulator = EquityAccumulator(len(hands))
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    while True:
+        remaining = max_rollouts - accumulator.rollouts
+        batches = await asyncio.gather(
+            *(
+                loop.run_in_executor(
+                    executor,
+                    rollout_batch,
+                    hands,
+                    board,
+                    live,
+                    size,
+                    batch_seed,
+                )
+                for size, batch_seed in _wave(
+                    rng, remaining, workers, batch_size
+                )
+            )
+        )
+        for batch in batches:
+            accumulator.add(batch)
+        result, done = _progress(
+            accumulator, start, target_stderr, time_budget, max_rollouts
+        )
+        yield result
+        if done:
+            return
+
+
+def monte_carlo_equity(
+    hands: Sequence[Sequence[int]],
+    board: Sequence[int] = (),
+    workers: int | None = None,
+    executor: Executor | None = None,
+    **options,
+) -> EquityResult:
+    """Estimate each player's win, tie and loss probability and pot equity.
+    Runs on `executor` if given, otherwise on a new pool of `workers`
+    processes; `options` are passed on to `iter_monte_carlo`. Each wave
+    has `workers` batches, by default as many as `executor` has workers,
+    or one per CPU."""
+    if workers is None:
+        workers = (
+            getattr(executor, "_max_workers", None) or os.cpu_count() or 1
+        )
+    _check_options(
+        workers,
+        options.get("batch_size", BATCH_SIZE),
+        options.get("max_rollouts", MAX_ROLLOUTS),
+    )
+    if executor is not None:
+        *_, result = iter_monte_carlo(
+            hands, board, executor, workers, **options
+        )
+        return result
+    evaluator.warm_up()  # forked workers inherit the tables
+    with ProcessPoolExecutor(workers, initializer=init_worker) as executor:
+        *_, result = iter_monte_carlo(
+            hands, board, executor, workers, **options
+        )
+    return result
+
+
+def _runout_key(
+    runout: Sequence[int],
+    board: Sequence[int],
+    known_suits: set[int],
+    max_hole_suits: list[int],
+) -> tuple[tuple[int, int], ...]:
+    """Describe a runout up to the suit symmetries that cannot change any
+    player's result. A suit matters only if some player could still make
+    a flush in it; runout cards of other suits keep just their rank.
+    Suits that no known card uses are interchangeable, so they all share
+    one label."""
+    suit_counts = [0, 0, 0, 0]
+    for card in itertools.chain(board, runout):
+        suit_counts[card & 3] += 1
+    key = []
+    for card in runout:
+        suit = card & 3
+        if suit_counts[suit] + max_hole_suits[suit] < 5:
+            key.append((card >> 2, -1))
+        elif suit in known_suits:
+            key.append((card >> 2, suit))
+        else:
+            key.append((card >> 2, 4))
+    return tuple(sorted(key))
+
+
+def exact_equity(
+    hands: Sequence[Sequence[int]],
+    board: Sequence[int] = (),
+    reduce_suits: bool = True,
+) -> EquityResult:
+    """Enumerate every runout of the board. With `reduce_suits`, runouts
+    that only differ by interchangeable suits are scored once."""
+    start = time.perf_counter()
+    live = live_cards(hands, board)
+    hands = [list(hand) for hand in hands]
+    board = list(board)
+    known_suits = {card & 3 for card in itertools.chain(board, *hands)}
+    max_hole_suits = [
+        max(sum(card & 3 == suit for card in hand) for hand in hands)
+        for suit in range(4)
+    ]
+    classes: dict[tuple, list] = {}
+    for runout in itertools.combinations(live, 5 - len(board)):
+        if reduce_suits:
+            key = _runout_key(runout, board, known_suits, max_hole_suits)
+        else:
+            key = runout
+        if key in classes:
+            classes[key][1] += 1
+        else:
+            classes[key] = [runout, 1]
+
+    wins = [0] * len(hands)
+    ties = [0] * len(hands)
+    shares = [0.0] * len(hands)
+    rollouts = 0
+    for runout, weight in classes.values():
+        runout = board + list(runout)
+        ranks = [evaluator.evaluate_best(hand + runout) for hand in hands]
+        best = max(ranks)
+        winners = [i for i, rank in enumerate(ranks) if rank == best]
+        for i in winners:
+            if len(winners) == 1:
+                wins[i] += weight
+            else:
+                ties[i] += weight
+            shares[i] += weight / len(winners)
+        rollouts += weight
+
+    accumulator = EquityAccumulator(len(hands))
+    accumulator.add((rollouts, wins, ties, shares, [0.0] * len(hands)))
+    for player in accumulator.players:
+        player.exact = True
+    return accumulator.result(time.perf_counter() - start, converged=True)
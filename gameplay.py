@@ -1,18 +1,44 @@
 import random
-from hand_ranker.models import Card
+
+import numpy as np
+
+from hand_ranker.models import card_registry
+
+
+def deck_codes() -> tuple[int, ...]:
+    """The card codes of the 52 `Card` rows, queried once per process."""
+    return card_registry().codes
 
 
 class Deck:
 
-    cards: list[Card]
+    cards: list[int]
 
-    def __init__(self):
+    def __init__(self, rng: random.Random | None = None):
+        self.rng = rng or random.Random()
         self.new_game()
 
     def new_game(self):
-        self.cards = list(Card.objects.all())
-        random.shuffle(self.cards)
+        self.cards = list(deck_codes())
+        self.rng.shuffle(self.cards)
+
+    def deal(self, n: int = 1) -> list[int]:
+        if not 0 <= n <= len(self.cards):
+            raise ValueError(f"Cannot deal {n} of {len(self.cards)} cards")
+        # not `[-n:]`, which is the whole deck for n == 0
+        start = len(self.cards) - n
+        dealt = self.cards[start:]
+        del self.cards[start:]
+        return dealt
+
 
-    def deal(self, n: int = 1) -> Card:
-        for _ in n:
-            self.cards.pop()
+def deal_many(
+    games: int, n: int, rng: np.random.Generator | None = None
+) -> np.ndarray:
+    """Shuffle `games` decks at once and deal `n` cards from each, returned
+    as a (games, n) array of card codes."""
+    if not 0 <= n <= 52:
+        raise ValueError(f"Cannot deal {n} of 52 cards")
+    rng = rng or np.random.default_rng()
+    decks = np.tile(np.array(deck_codes(), dtype=np.int8), (games, 1))
+    return rng.permuted(decks, axis=1)[:, :n]
@@ -0,0 +1,130 @@
+"""Vectorized evaluation of many hands at once with NumPy.
+
+Hands are rows of integer card codes (see `hand_ranker.cards`): (N, 5) for
+single hands or (N, 7) for the best 5 of 7 cards. Ranks come from a binary
+search over the 7,462 strength keys of `hand_ranker.evaluator`, or from a
+memory-mapped `RankTable` when one is given.
+"""
+
+import itertools
+from math import comb
+
+import numpy as np
+from numpy.typing import ArrayLike
+
+from . import evaluator
+from .rank_table import RankTable
+
+CHUNK_SIZE = 100_000
+
+_PRIME_OF_CODE = np.array(
+    [evaluator.PRIMES[code >> 2] for code in range(52)], dtype=np.int64
+)
+_CHOOSE = np.array(
+    [[comb(n, k) for n in range(52)] for k in range(6)], dtype=np.int64
+)
+_SEVEN_CARD_SUBSETS = np.array(
+    list(itertools.combinations(range(7), 5)), dtype=np.intp
+)
+
+
+def _build_tables() -> tuple[np.ndarray, ...]:
+    ranks = {}
+    type_floors = {}
+    for strength in evaluator.strength_classes():
+        key = evaluator.rank_key(strength.ranks) * 2 + strength.flush
+        ranks[key] = strength.rank
+        type_floors[strength.hand_type] = strength.rank
+    keys = np.array(sorted(ranks), dtype=np.int64)
+    key_ranks = np.array([ranks[key] for key in keys], dtype=np.uint32)
+    types = sorted(type_floors, key=type_floors.get)
+    floors = np.array([type_floors[t] for t in types], dtype=np.uint32)
+    return keys, key_ranks, floors, np.array(types, dtype=np.uint8)
+
+
+_KEYS, _KEY_RANKS, _TYPE_FLOORS, _TYPES = _build_tables()
+
+
+def _evaluate_five(cards: np.ndarray, table: RankTable | None) -> np.ndarray:
+    if table is not None:
+        cards = np.sort(cards, axis=1)
+        index = sum(_CHOOSE[k + 1][cards[:, k]] for k in range(5))
+        return np.frombuffer(table.ranks, dtype=np.uint32)[index]
+    key = _PRIME_OF_CODE[cards].prod(axis=1) * 2
+    suits = cards & 3
+    key += (suits == suits[:, :1]).all(axis=1)
+    found = np.searchsorted(_KEYS, key)
+    # clipped so a key past the last one compares unequal instead of failing
+    if not (_KEYS[np.minimum(found, len(_KEYS) - 1)] == key).all():
+        raise ValueError("Not every row is a valid hand")
+    return _KEY_RANKS[found]
+
+
+def _check_cards(cards: np.ndarray):
+    if cards.size and (cards.min() < 0 or cards.max() > 51):
+        raise ValueError("Card codes must be in range(52)")
+    ordered = np.sort(cards, axis=1)
+    if (ordered[:, 1:] == ordered[:, :-1]).any():
+        raise ValueError("Every row needs distinct cards")
+
+
+def evaluate(
+    cards: ArrayLike,
+    table: RankTable | None = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> np.ndarray:
+    """Return the `Hand.rank` of each row of 5 or 7 distinct card codes,
+    raising ValueError for any other input."""
+    cards = np.asarray(cards, dtype=np.intp)
+    if cards.ndim != 2 or cards.shape[1] not in (5, 7):
+        raise ValueError(
+            f"Expected an (N, 5) or (N, 7) array, got {cards.shape}"
+        )
+    ranks = np.empty(len(cards), dtype=np.uint32)
+    for start in range(0, len(cards), chunk_size):
+        chunk = cards[start : start + chunk_size]
+        _check_cards(chunk)
+        if chunk.shape[1] == 5:
+            ranks[start : start + len(chunk)] = _evaluate_five(chunk, table)
+        else:
+            subsets = chunk[:, _SEVEN_CARD_SUBSETS].reshape(-1, 5)
+            best = _evaluate_five(subsets, table).reshape(-1, 21).max(axis=1)
+            ranks[start : start + len(chunk)] = best
+    return ranks
+
+
+def hand_types(ranks: ArrayLike) -> np.ndarray:
+    """Return the `Hand.HandType` value of each rank, raising ValueError
+    for ranks no hand has."""
+    ranks = np.asarray(ranks)
+    if ranks.size and (
+        ranks.min() < _TYPE_FLOORS[0] or ranks.max() > evaluator.MAX_RANK
+    ):
+        raise ValueError(
+            f"Ranks must be from {_TYPE_FLOORS[0]} to {evaluator.MAX_RANK}"
+        )
+    floors = np.searchsorted(_TYPE_FLOORS, ranks, side="right") - 1
+    return _TYPES[floors]
+
+
+def evaluate_with_types(
+    cards: ArrayLike, table: RankTable | None = None
+) -> tuple[np.ndarray, np.ndarray]:
+    ranks = evaluate(cards, table)
+    return ranks, hand_types(ranks)
+
+
+def winners(ranks: ArrayLike) -> np.ndarray:
+    """Boolean (games, players) mask of each game's winners given their
+    ranks; a game with more than one winner is a split pot."""
+    ranks = np.asarray(ranks)
+    return ranks == ranks.max(axis=1, keepdims=True)
+
+
+def showdown(cards: ArrayLike, table: RankTable | None = None) -> np.ndarray:
+    """Winners of many showdowns at once from a (games, players, 5 or 7)
+    array of card codes."""
+    cards = np.asarray(cards)
+    games, players, size = cards.shape
+    ranks = evaluate(cards.reshape(-1, size), table)
+    return winners(ranks.reshape(games, players))
@@ -0,0 +1,446 @@
+"""Micro-benchmarks for hand ranking, run with `manage.py benchmark`.
+
+Every benchmark reports the median of several timed runs, the spread of
+those runs and the peak memory of one extra run; `compare` checks the
+results against a stored baseline.
+"""
+
+import functools
+import itertools
+import json
+import logging
+import random
+import time
+import tracemalloc
+from collections.abc import Callable
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Q
+from django.test import Client
+from django.test import override_settings
+from django.urls import reverse
+
+import equity
+from gameplay import Deck
+from gameplay import deal_many
+
+from . import batch
+from . import evaluator
+from . import rank_table
+from .cards import DECK
+from .cards import to_str
+from .generate import RankedHandsGenerator
+from .generate import batched
+from .instrumentation import Instrumentation
+from .models import Hand
+from .models import PackedHand
+from .models import card_registry
+
+REPEAT = 5
+
+# set by `run_benchmark` for the `_timed` calls it makes
+_options = {"repeat": REPEAT, "memory": True}
+
+
+def _timed(run: Callable[[], int], repeat: int | None = None) -> dict:
+    """Call `run` (which returns its number of operations) `repeat` times
+    and report the median throughput and the spread of the run times.
+    With memory tracking on, an extra untimed first run under tracemalloc
+    measures the peak memory allocated and warms up any caches."""
+    peak_memory = None
+    if _options["memory"]:
+        tracemalloc.start()
+        try:
+            run()
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    times = []
+    for _ in range(repeat or _options["repeat"]):
+        start = time.perf_counter()
+        ops = run()
+        times.append(time.perf_counter() - start)
+    p50, p90, p99 = np.percentile(times, [50, 90, 99])
+    return {
+        "ops": ops,
+        "repeat": len(times),
+        "seconds": p50,
+        "ops_per_sec": ops / p50,
+        "min_seconds": min(times),
+        "p50_seconds": p50,
+        "p90_seconds": p90,
+        "p99_seconds": p99,
+        "max_seconds": max(times),
+        "peak_memory_bytes": peak_memory,
+    }
+
+
+def bench_evaluate(iterations: int = 1_000_000, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    hands = [rng.sample(DECK, 5) for _ in range(iterations)]
+
+    def run() -> int:
+        evaluate = evaluator.evaluate
+        for hand in hands:
+            evaluate(hand)
+        return len(hands)
+
+    return _timed(run)
+
+
+def bench_evaluate_best(iterations: int = 200_000, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    hands = [rng.sample(DECK, 7) for _ in range(iterations)]
+    evaluator.evaluate_best(hands[0])  # build the 7-card tables untimed
+
+    def run() -> int:
+        evaluate_best = evaluator.evaluate_best
+        for hand in hands:
+            evaluate_best(hand)
+        return len(hands)
+
+    return _timed(run)
+
+
+def bench_evaluate_best_naive(iterations: int = 200_000, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    hands = [rng.sample(DECK, 7) for _ in range(iterations)]
+
+    def run() -> int:
+        evaluate = evaluator.evaluate
+        for hand in hands:
+            max(evaluate(subset) for subset in itertools.combinations(hand, 5))
+        return len(hands)
+
+    return _timed(run)
+
+
+def bench_rank_table(iterations: int = 1_000_000, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    hands = [rng.sample(DECK, 5) for _ in range(iterations)]
+    table = rank_table.RankTable()
+
+    def run() -> int:
+        rank = table.rank
+        for hand in hands:
+            rank(hand)
+        return len(hands)
+
+    try:
+        return _timed(run)
+    finally:
+        table.close()
+
+
+def bench_batch_evaluate(iterations: int = 1_000_000, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    hands = rng.random((iterations, 52)).argsort(axis=1)[:, :5]
+    return _timed(lambda: len(batch.evaluate(hands)))
+
+
+def bench_deal(iterations: int = 100_000, seed: int = 0) -> dict:
+    deck = Deck(random.Random(seed))
+
+    def run() -> int:
+        for _ in range(iterations):
+            deck.new_game()
+            deck.deal(9)
+        return iterations
+
+    return _timed(run)
+
+
+def bench_deal_many(iterations: int = 1_000_000, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    return _timed(lambda: len(deal_many(iterations, 9, rng)))
+
+
+def bench_lookup(iterations: int = 10_000, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    hands = [rng.sample(DECK, 5) for _ in range(iterations)]
+
+    def run() -> int:
+        for hand in hands:
+            Hand.objects.lookup(hand)
+        return len(hands)
+
+    return _timed(run)
+
+
+def bench_lookup_many(iterations: int = 100_000, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    hands = [rng.sample(DECK, 5) for _ in range(iterations)]
+    return _timed(lambda: len(Hand.objects.lookup_many(hands)))
+
+
+def bench_lookup_many_classes(iterations: int = 100_000, seed: int = 0) -> dict:
+    """`lookup_many` answered from the HandClass table."""
+    with override_settings(HAND_RANKER_HAND_STORE="classes"):
+        return bench_lookup_many(iterations, seed)
+
+
+def bench_all_hands(iterations: int = 10, seed: int = 0) -> dict:
+    cards = random.Random(seed).sample(card_registry().cards, iterations)
+    return _timed(lambda: sum(1 for card in cards if card.all_hands.count()))
+
+
+def bench_all_hands_card_columns(iterations: int = 10, seed: int = 0) -> dict:
+    """`Card.all_hands` as it was: an OR across the five card columns."""
+    cards = random.Random(seed).sample(card_registry().cards, iterations)
+
+    def run() -> int:
+        for card in cards:
+            Hand.objects.filter(
+                Q(card5=card)
+                | Q(card4=card)
+                | Q(card3=card)
+                | Q(card2=card)
+                | Q(card1=card)
+            ).count()
+        return len(cards)
+
+    return _timed(run)
+
+
+def bench_containing(iterations: int = 10, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    card_pairs = [rng.sample(DECK, 2) for _ in range(iterations)]
+    return _timed(
+        lambda: sum(
+            1 for cards in card_pairs if Hand.objects.containing(cards).count()
+        )
+    )
+
+
+def bench_percentile(iterations: int = 1_000_000, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    classes = evaluator.strength_classes()
+    ranks = [rng.choice(classes).rank for _ in range(iterations)]
+
+    def run() -> int:
+        percentile = evaluator.percentile
+        for rank in ranks:
+            percentile(rank)
+        return len(ranks)
+
+    return _timed(run)
+
+
+def bench_percentile_count(iterations: int = 100, seed: int = 0) -> dict:
+    """Percentiles as a COUNT(*) over the Hand table."""
+    rng = random.Random(seed)
+    classes = evaluator.strength_classes()
+    ranks = [rng.choice(classes).rank for _ in range(iterations)]
+
+    def run() -> int:
+        hands = Hand.objects.all()
+        for rank in ranks:
+            100 * hands.filter(rank__lte=rank).count() / hands.count()
+        return len(ranks)
+
+    return _timed(run)
+
+
+def bench_http_evaluate(
+    iterations: int = 1_000, batch_size: int = 100, seed: int = 0
+) -> dict:
+    """Hands per second through the JSON endpoint on a test client, in
+    requests of `batch_size` hands."""
+    rng = random.Random(seed)
+    bodies = [
+        json.dumps(
+            {
+                "hands": [
+                    " ".join(map(to_str, rng.sample(DECK, rng.choice((5, 7)))))
+                    for _ in range(batch_size)
+                ]
+            }
+        )
+        for _ in range(iterations)
+    ]
+    client = Client(SERVER_NAME="localhost")
+    url = reverse("hand_ranker:evaluate")
+    evaluator.warm_up()  # build the 7-card tables untimed
+
+    def run() -> int:
+        for body in bodies:
+            client.post(url, body, content_type="application/json")
+        return len(bodies) * batch_size
+
+    return _timed(run)
+
+
+def _bench_generate(method: str | None = None) -> dict:
+    """Generate every hand, or one category's, without the database."""
+    start_rank = RankedHandsGenerator.MAX_RANK
+    if method is not None:
+        start_rank = next(
+            unit[2]
+            for unit in RankedHandsGenerator.work_units()
+            if unit[0] == method
+        )
+
+    def run() -> int:
+        generator = RankedHandsGenerator(
+            instrumentation=Instrumentation(level=logging.DEBUG)
+        )
+        generator.current_rank = start_rank
+        if method is None:
+            hands = generator.iter_all_hands()
+        else:
+            hands = getattr(generator, method)()
+        return sum(1 for _ in hands)
+
+    # a full run takes minutes, so it is only timed once
+    return _timed(run, repeat=1 if method is None else None)
+
+
+def bench_generate() -> dict:
+    return _bench_generate()
+
+
+def bench_comparison_array(iterations: int = 100_000, seed: int = 0) -> dict:
+    """Compare pairs of random hands by `_get_comparison_array`, clearing
+    the cached array first so that it is computed every time."""
+    rng = random.Random(seed)
+    registry = card_registry()
+    pairs = []
+    for _ in range(iterations):
+        pair = []
+        for _ in range(2):
+            codes = sorted(rng.sample(DECK, 5))
+            cards = [registry.by_code[code] for code in codes]
+            rank, hand_type = evaluator.evaluate_with_type(codes)
+            pair.append(
+                Hand(
+                    **{f"card{i + 1}": card for i, card in enumerate(cards)},
+                    rank=rank,
+                    hand_type=hand_type,
+                )
+            )
+        pairs.append(pair)
+
+    def run() -> int:
+        for a, b in pairs:
+            a.__dict__.pop("comparison_array", None)
+            b.__dict__.pop("comparison_array", None)
+            a._get_comparison_array() < b._get_comparison_array()
+        return len(pairs)
+
+    return _timed(run)
+
+
+def bench_exact_equity(iterations: int = 20, seed: int = 0) -> dict:
+    """Heads-up exact equity on random flops."""
+    rng = random.Random(seed)
+    spots = [rng.sample(DECK, 7) for _ in range(iterations)]
+    evaluator.warm_up()  # build the 7-card tables untimed
+
+    def run() -> int:
+        for cards in spots:
+            equity.exact_equity([cards[:2], cards[2:4]], cards[4:])
+        return len(spots)
+
+    return _timed(run)
+
+
+def _bench_bulk_create(model: type[Hand | PackedHand]) -> dict:
+    """Rewrite every Trips hand inside a transaction that is rolled back."""
+    method, _, start_rank = next(
+        unit
+        for unit in RankedHandsGenerator.work_units()
+        if unit[0] == "_generate_trips"
+    )
+    generator = RankedHandsGenerator()
+    generator.current_rank = start_rank
+    hands = list(getattr(generator, method)())
+    if model is PackedHand:
+        hands = [PackedHand.from_hand(hand) for hand in hands]
+
+    def run() -> int:
+        # a savepoint, so that every repeat writes the same rows again
+        with transaction.atomic():
+            for batch in batched(hands, RankedHandsGenerator.BATCH_SIZE):
+                model.objects.bulk_create(batch)
+            transaction.set_rollback(True)
+        return len(hands)
+
+    with transaction.atomic():
+        model.objects.filter(
+            rank__lte=start_rank, rank__gt=generator.current_rank
+        ).delete()
+        result = _timed(run)
+        transaction.set_rollback(True)
+    return result
+
+
+def bench_bulk_create() -> dict:
+    return _bench_bulk_create(Hand)
+
+
+def bench_bulk_create_packed() -> dict:
+    return _bench_bulk_create(PackedHand)
+
+
+BENCHMARKS: dict[str, Callable[[], dict]] = {
+    "evaluate": bench_evaluate,
+    "evaluate_best": bench_evaluate_best,
+    "evaluate_best_naive": bench_evaluate_best_naive,
+    "rank_table": bench_rank_table,
+    "batch_evaluate": bench_batch_evaluate,
+    "deal": bench_deal,
+    "deal_many": bench_deal_many,
+    "bulk_create": bench_bulk_create,
+    "bulk_create_packed": bench_bulk_create_packed,
+    "lookup": bench_lookup,
+    "lookup_many": bench_lookup_many,
+    "lookup_many_classes": bench_lookup_many_classes,
+    "all_hands": bench_all_hands,
+    "all_hands_card_columns": bench_all_hands_card_columns,
+    "containing": bench_containing,
+    "percentile": bench_percentile,
+    "percentile_count": bench_percentile_count,
+    "http_evaluate": bench_http_evaluate,
+    "comparison_array": bench_comparison_array,
+    "exact_equity": bench_exact_equity,
+    "generate": bench_generate,
+}
+BENCHMARKS.update(
+    (
+        f"generate_{method.removeprefix('_generate_')}",
+        functools.partial(_bench_generate, method),
+    )
+    for _, method, _ in RankedHandsGenerator.CATEGORIES
+)
+
+
+def run_benchmark(name: str, repeat: int = REPEAT, memory: bool = True) -> dict:
+    _options.update(repeat=repeat, memory=memory)
+    try:
+        return BENCHMARKS[name]()
+    finally:
+        _options.update(repeat=REPEAT, memory=True)
+
+
+def compare(
+    results: dict[str, dict], baseline: dict[str, dict], tolerance: float
+) -> list[dict]:
+    """Throughput of each benchmark in both `results` and `baseline`,
+    relative to the baseline. A result more than `tolerance` (a fraction)
+    slower than its baseline is a regression."""
+    rows = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        change = result["ops_per_sec"] / baseline[name]["ops_per_sec"] - 1
+        rows.append(
+            {
+                "name": name,
+                "baseline_ops_per_sec": baseline[name]["ops_per_sec"],
+                "ops_per_sec": result["ops_per_sec"],
+                "change": change,
+                "regression": change < -tolerance,
+            }
+        )
+    return rows
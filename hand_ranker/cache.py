@@ -0,0 +1,181 @@
+"""Bounded LRU caches for results that only depend on the cards up to suit.
+
+Keys are suit-canonical: of the 24 ways to relabel the suits, the one that
+sorts smallest is used, so AhKh vs QsQd and AsKs vs QhQc share an entry.
+Each process keeps its own LRU; with `settings.HAND_RANKER_CACHE_BACKEND`
+set to a Django cache alias, entries are also shared through that cache.
+"""
+
+import functools
+import hashlib
+import itertools
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from collections.abc import Hashable
+from collections.abc import Sequence
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import caches
+
+import equity
+
+from . import metrics
+
+SUIT_PERMUTATIONS = tuple(itertools.permutations(range(4)))
+
+_MISSING = object()
+
+
+def canonical_key(*groups: Sequence[int]) -> tuple[tuple[int, ...], ...]:
+    """Relabel the suits of the card code `groups` (e.g. each player's hole
+    cards, then the board) and sort each group's cards, choosing the
+    relabelling that gives the smallest key. Groups keep their order."""
+    return min(
+        tuple(
+            tuple(sorted(card & ~3 | suits[card & 3] for card in group))
+            for group in groups
+        )
+        for suits in SUIT_PERMUTATIONS
+    )
+
+
+class ResultCache:
+    """A thread-safe LRU of at most `maxsize` entries that counts its hits,
+    misses and evictions."""
+
+    def __init__(self, name: str, maxsize: int | None = None):
+        self.name = name
+        self.maxsize = maxsize or settings.HAND_RANKER_CACHE_SIZE
+        self._entries: OrderedDict[Hashable, Any] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def backend(self):
+        alias = settings.HAND_RANKER_CACHE_BACKEND
+        return caches[alias] if alias else None
+
+    def backend_key(self, key: Hashable) -> str:
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return f"hand_ranker:{self.name}:{digest}"
+
+    def _get_local(self, key: Hashable) -> Any:
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+            if value is not _MISSING:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        if value is not _MISSING:
+            metrics.count_cache_lookup(hit=True)
+        return value
+
+    def _set_local(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _count_shared(self, key: Hashable, value: Any) -> Any:
+        with self._lock:
+            if value is _MISSING:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.shared_hits += 1
+        metrics.count_cache_lookup(hit=value is not _MISSING)
+        if value is not _MISSING:
+            self._set_local(key, value)
+        return value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = self._get_local(key)
+        if value is _MISSING:
+            backend = self.backend
+            if backend is not None:
+                value = backend.get(self.backend_key(key), _MISSING)
+            value = self._count_shared(key, value)
+        return default if value is _MISSING else value
+
+    def set(self, key: Hashable, value: Any):
+        self._set_local(key, value)
+        if (backend := self.backend) is not None:
+            backend.set(self.backend_key(key), value)
+
+    async def aget(self, key: Hashable, default: Any = None) -> Any:
+        value = self._get_local(key)
+        if value is _MISSING:
+            backend = self.backend
+            if backend is not None:
+                value = await backend.aget(self.backend_key(key), _MISSING)
+            value = self._count_shared(key, value)
+        return default if value is _MISSING else value
+
+    async def aset(self, key: Hashable, value: Any):
+        self._set_local(key, value)
+        if (backend := self.backend) is not None:
+            await backend.aset(self.backend_key(key), value)
+
+    def get_or_set(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.shared_hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Hand ranks are not cached: `evaluator.evaluate` is faster than
+# building a canonical key, and every request ranks hands with it.
+equity_cache = ResultCache("equity")
+
+
+def equity_key(
+    hands: Sequence[Sequence[int]],
+    board: Sequence[int],
+    exact: bool,
+    options: dict,
+) -> tuple:
+    return canonical_key(*hands, board), exact, tuple(sorted(options.items()))
+
+
+def equity_result(
+    hands: Sequence[Sequence[int]],
+    board: Sequence[int] = (),
+    exact: bool = False,
+    **options,
+) -> equity.EquityResult:
+    """`equity.exact_equity`, or `equity.monte_carlo_equity` with
+    `options`, cached."""
+    if exact:
+        compute = functools.partial(equity.exact_equity, hands, board)
+    else:
+        compute = functools.partial(
+            equity.monte_carlo_equity, hands, board, **options
+        )
+    return equity_cache.get_or_set(
+        equity_key(hands, board, exact, options), compute
+    )
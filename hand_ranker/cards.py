@@ -0,0 +1,44 @@
+"""Compact integer card codes.
+
+A card code packs a `Card`'s rank and suit into one int in range(52):
+``(rank - 2) * 4 + (suit - 1)``. Codes sort by rank first, so ``code >> 2``
+is the rank index (0 for TWO, 12 for ACE) and ``code & 3`` the suit index.
+Short notation is the usual rank character followed by a suit letter,
+e.g. "As", "Td" or "2c".
+"""
+
+RANK_CHARS = "23456789TJQKA"
+SUIT_CHARS = "cdhs"  # Card.Suit CLUB, DIAMOND, HEART, SPADE
+
+DECK = tuple(range(52))
+
+
+def encode(rank: int, suit: int) -> int:
+    return (rank - 2) * 4 + (suit - 1)
+
+
+def rank_of(code: int) -> int:
+    return (code >> 2) + 2
+
+
+def suit_of(code: int) -> int:
+    return (code & 3) + 1
+
+
+def parse(text: str) -> int:
+    text = text.strip()
+    if len(text) != 2:
+        raise ValueError(f"Invalid card: {text!r}")
+    rank = RANK_CHARS.find(text[0].upper())
+    suit = SUIT_CHARS.find(text[1].lower())
+    if rank < 0 or suit < 0:
+        raise ValueError(f"Invalid card: {text!r}")
+    return rank * 4 + suit
+
+
+def parse_cards(text: str) -> list[int]:
+    return [parse(card) for card in text.split()]
+
+
+def to_str(code: int) -> str:
+    return RANK_CHARS[code >> 2] + SUIT_CHARS[code & 3]
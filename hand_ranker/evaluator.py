@@ -0,0 +1,231 @@
+"""Hand evaluation on integer card codes, without the ORM.
+
+Every 5-card hand is identified by the product of one prime per card rank
+(unique for each rank multiset) plus whether all five cards share a suit.
+The tables mapping those keys to `Hand.rank` are built by walking the
+strength classes in the same order as `RankedHandsGenerator`, so
+`evaluate()` returns exactly the rank stored in the `Hand` table.
+
+`strength_class()` maps a rank back to its class: hand type, rank pattern
+and number of hands sharing it, from which `percentile()` and the counts
+of hands beating or beaten by it follow without querying the database.
+
+`evaluate_best()` extends this to 6 and 7 cards (Texas Hold'em hole cards
+plus board) with tables of the best non-flush rank of every rank multiset
+and the best flush of every set of suited ranks, built on first use or by
+`warm_up()`, which the WSGI and ASGI applications call at startup.
+"""
+
+import bisect
+import functools
+import itertools
+from collections import Counter
+from collections.abc import Iterator
+from collections.abc import Sequence
+from math import prod
+from typing import NamedTuple
+
+from .models import Hand
+
+MAX_RANK = 2_598_960
+
+PRIMES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+
+# rank indexes (0 for TWO, 12 for ACE), strongest first
+_RANKS_DESC = tuple(range(12, -1, -1))
+_WHEEL = (3, 2, 1, 0, 12)
+
+
+class StrengthClass(NamedTuple):
+    rank: int
+    hand_type: Hand.HandType
+    # rank indexes in `Hand._get_comparison_array` order
+    pattern: tuple[int, ...]
+    # rank indexes of all five cards
+    ranks: tuple[int, ...]
+    flush: bool
+    combos: int
+
+
+def _straights() -> Iterator[tuple[int, ...]]:
+    for top in range(12, 3, -1):
+        yield tuple(range(top, top - 5, -1))
+    yield _WHEEL
+
+
+def _distinct_non_straights() -> Iterator[tuple[int, ...]]:
+    straights = {frozenset(ranks) for ranks in _straights()}
+    for ranks in itertools.combinations(_RANKS_DESC, 5):
+        if frozenset(ranks) not in straights:
+            yield ranks
+
+
+def _unsized_classes() -> Iterator[tuple]:
+    """(hand_type, pattern, ranks, flush, combos) from strongest to
+    weakest, in the same loop order as the `_generate_*` methods."""
+    for ranks in _straights():
+        yield Hand.HandType.STRAIGHT_FLUSH, ranks[:1], ranks, True, 4
+    for quad, kicker in itertools.permutations(_RANKS_DESC, 2):
+        ranks = (quad,) * 4 + (kicker,)
+        yield Hand.HandType.QUADS, (quad, kicker), ranks, False, 4
+    for trip, pair in itertools.permutations(_RANKS_DESC, 2):
+        ranks = (trip,) * 3 + (pair,) * 2
+        yield Hand.HandType.FULL_HOUSE, (trip, pair), ranks, False, 24
+    for ranks in _distinct_non_straights():
+        yield Hand.HandType.FLUSH, ranks, ranks, True, 4
+    for ranks in _straights():
+        yield Hand.HandType.STRAIGHT, ranks[:1], ranks, False, 4**5 - 4
+    for trip in _RANKS_DESC:
+        others = [r for r in _RANKS_DESC if r != trip]
+        for kickers in itertools.combinations(others, 2):
+            ranks = (trip,) * 3 + kickers
+            yield Hand.HandType.TRIPS, (trip,) + kickers, ranks, False, 64
+    for pairs in itertools.combinations(_RANKS_DESC, 2):
+        for kicker in [r for r in _RANKS_DESC if r not in pairs]:
+            pattern = pairs + (kicker,)
+            ranks = (pairs[0],) * 2 + (pairs[1],) * 2 + (kicker,)
+            yield Hand.HandType.TWO_PAIR, pattern, ranks, False, 144
+    for pair in _RANKS_DESC:
+        others = [r for r in _RANKS_DESC if r != pair]
+        for kickers in itertools.combinations(others, 3):
+            ranks = (pair,) * 2 + kickers
+            yield Hand.HandType.PAIR, (pair,) + kickers, ranks, False, 384
+    for ranks in _distinct_non_straights():
+        yield Hand.HandType.HIGH_CARD, ranks, ranks, False, 4**5 - 4
+
+
+def strength_classes() -> list[StrengthClass]:
+    """All 7,462 distinct hand strengths, strongest first, with the rank
+    `RankedHandsGenerator` assigns to each of their hands."""
+    classes = []
+    current_rank = MAX_RANK
+    for hand_type, pattern, ranks, flush, combos in _unsized_classes():
+        classes.append(
+            StrengthClass(
+                current_rank, hand_type, pattern, ranks, flush, combos
+            )
+        )
+        current_rank -= combos
+    return classes
+
+
+def rank_key(ranks: Sequence[int]) -> int:
+    return prod(PRIMES[rank] for rank in ranks)
+
+
+def _build_tables() -> tuple[dict, dict, list, list]:
+    flush_ranks, ranks, type_floors, types = {}, {}, [], []
+    for strength in reversed(strength_classes()):
+        table = flush_ranks if strength.flush else ranks
+        table[rank_key(strength.ranks)] = strength.rank
+        if not types or types[-1] != strength.hand_type:
+            # lowest rank of each hand type, weakest type first
+            type_floors.append(strength.rank)
+            types.append(strength.hand_type)
+    return flush_ranks, ranks, type_floors, types
+
+
+_FLUSH_RANKS, _RANKS, _TYPE_FLOORS, _TYPES = _build_tables()
+_PRIME_OF_CODE = tuple(PRIMES[code >> 2] for code in range(52))
+
+
+def evaluate(cards: Sequence[int]) -> int:
+    """Return the `Hand.rank` of five card codes, in any order."""
+    c1, c2, c3, c4, c5 = cards
+    key = (
+        _PRIME_OF_CODE[c1]
+        * _PRIME_OF_CODE[c2]
+        * _PRIME_OF_CODE[c3]
+        * _PRIME_OF_CODE[c4]
+        * _PRIME_OF_CODE[c5]
+    )
+    if ((c1 ^ c2) | (c1 ^ c3) | (c1 ^ c4) | (c1 ^ c5)) & 3:
+        return _RANKS[key]
+    return _FLUSH_RANKS[key]
+
+
+@functools.cache
+def _best_tables() -> tuple[dict[int, int], dict[int, int]]:
+    best_ranks = {}
+    for size in (6, 7):
+        for ranks in itertools.combinations_with_replacement(range(13), size):
+            if max(Counter(ranks).values()) > 4:
+                continue
+            best_ranks[rank_key(ranks)] = max(
+                _RANKS[rank_key(subset)]
+                for subset in itertools.combinations(ranks, 5)
+            )
+    best_ranks.update(_RANKS)
+    best_flush_ranks = dict(_FLUSH_RANKS)
+    for size in (6, 7):
+        for ranks in itertools.combinations(range(13), size):
+            best_flush_ranks[rank_key(ranks)] = max(
+                _FLUSH_RANKS[rank_key(subset)]
+                for subset in itertools.combinations(ranks, 5)
+            )
+    return best_ranks, best_flush_ranks
+
+
+def warm_up():
+    """Build the 6 and 7-card tables now, which takes a few seconds, rather
+    than in the first `evaluate_best` call."""
+    _best_tables()
+
+
+def evaluate_best(cards: Sequence[int]) -> int:
+    """Return the best `Hand.rank` among all 5-card subsets of 5 to 7 card
+    codes, e.g. two hole cards plus a five card board."""
+    best_ranks, best_flush_ranks = _best_tables()
+    key = 1
+    suit_keys = [1, 1, 1, 1]
+    suit_counts = [0, 0, 0, 0]
+    for code in cards:
+        prime = _PRIME_OF_CODE[code]
+        key *= prime
+        suit_keys[code & 3] *= prime
+        suit_counts[code & 3] += 1
+    for suit, count in enumerate(suit_counts):
+        if count >= 5:
+            # with at most 7 cards a flush rules out quads and full houses
+            return best_flush_ranks[suit_keys[suit]]
+    return best_ranks[key]
+
+
+def hand_type(rank: int) -> Hand.HandType:
+    """The type of every hand with this `Hand.rank`."""
+    if not _TYPE_FLOORS[0] <= rank <= MAX_RANK:
+        raise ValueError(f"{rank} is not a hand rank")
+    return _TYPES[bisect.bisect_right(_TYPE_FLOORS, rank) - 1]
+
+
+def evaluate_with_type(cards: Sequence[int]) -> tuple[int, Hand.HandType]:
+    rank = evaluate(cards)
+    return rank, hand_type(rank)
+
+
+_CLASSES_BY_RANK = {strength.rank: strength for strength in strength_classes()}
+
+
+def strength_class(rank: int) -> StrengthClass:
+    """The strength class shared by every hand with this `Hand.rank`."""
+    try:
+        return _CLASSES_BY_RANK[rank]
+    except KeyError:
+        raise ValueError(f"{rank} is not a hand rank") from None
+
+
+def hands_beating(rank: int) -> int:
+    """How many 5-card hands are stronger than a hand of this rank."""
+    return MAX_RANK - strength_class(rank).rank
+
+
+def hands_beaten(rank: int) -> int:
+    """How many 5-card hands are weaker than a hand of this rank."""
+    strength = strength_class(rank)
+    return strength.rank - strength.combos
+
+
+def percentile(rank: int) -> float:
+    """The percentage of 5-card hands that a hand of this rank beats or
+    ties."""
+    return 100 * strength_class(rank).rank / MAX_RANK
@@ -1,7 +1,27 @@
+import collections
 import itertools
-
+import logging
+import math
+import os
+from collections.abc import Callable
+from collections.abc import Iterable
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.db import transaction
+from django.db.models import Count
+
+from .instrumentation import Instrumentation
 from .models import Card
+from .models import GenerationCheckpoint
 from .models import Hand
+from .models import PackedHand
+from .models import card_mask
+from .models import card_registry
+from .models import reset_card_registry
+
+logger = logging.getLogger(__name__)
 
 
 class CardGenerator:
@@ -14,37 +34,282 @@ class CardGenerator:
             for suit in Card.Suit:
                 self.cards.append(Card(rank=rank, suit=suit))
 
-        return Card.objects.bulk_create(self.cards)
+        cards = Card.objects.bulk_create(self.cards)
+        reset_card_registry()
+        return cards
+
+
+def batched(iterable: Iterable, n: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, n)):
+        yield batch
 
 
 class RankedHandsGenerator:
 
     MAX_RANK = 2_598_960
-
-    def __init__(self):
+    BATCH_SIZE = 10_000
+
+    # (label, method, number of hands) from strongest to weakest
+    CATEGORIES = (
+        ("Straight Flushes", "_generate_straight_flushes", 40),
+        ("Quads", "_generate_quads", 624),
+        ("Full Houses", "_generate_full_houses", 3_744),
+        ("Flushes", "_generate_flushes", 5_108),
+        ("Straights", "_generate_straights", 10_200),
+        ("Trips", "_generate_trips", 54_912),
+        ("Two Pairs", "_generate_two_pairs", 123_552),
+        ("Pairs", "_generate_pairs", 1_098_240),
+        ("High Cards", "_generate_high_cards", 1_302_540),
+    )
+
+    # categories whose outermost loop can be split into one slice per rank
+    SLICED_CATEGORIES = (
+        "_generate_flushes",
+        "_generate_pairs",
+        "_generate_high_cards",
+    )
+
+    def __init__(
+        self,
+        cards: Iterable[Card] | None = None,
+        instrumentation: Instrumentation | None = None,
+    ):
         self.current_rank = self.MAX_RANK
+        self.instrumentation = instrumentation or Instrumentation()
         self.records = []
-        self.lookup = {
-            (card.rank, card.suit): card for card in Card.objects.all()
-        }
+        if cards is None:
+            cards = card_registry().cards
+        self.lookup = {(card.rank, card.suit): card for card in cards}
+
+    @property
+    def categories(self) -> list[tuple[str, Callable[[], Iterator[Hand]]]]:
+        return [
+            (label, getattr(self, method))
+            for label, method, _ in self.CATEGORIES
+        ]
+
+    @classmethod
+    def work_units(cls) -> list[tuple[str, Card.Rank | None, int]]:
+        """Split generation into independent (method, outer rank, start
+        rank) units. Start ranks follow from the fixed category sizes, so
+        every unit can be generated without running the ones before it."""
+        units = []
+        current_rank = cls.MAX_RANK
+        for _, method, size in cls.CATEGORIES:
+            if method not in cls.SLICED_CATEGORIES:
+                units.append((method, None, current_rank))
+                current_rank -= size
+                continue
+            for outer in reversed(Card.Rank):
+                slice_size = cls._slice_size(method, outer)
+                if slice_size:
+                    units.append((method, outer, current_rank))
+                    current_rank -= slice_size
+        return units
+
+    @staticmethod
+    def _slice_size(method: str, outer: Card.Rank) -> int:
+        if method == "_generate_pairs":
+            # 3 distinct kickers, 6 pair suit combos, 4^3 kicker suits
+            return math.comb(len(Card.Rank) - 1, 3) * 6 * 64
+        # 5 distinct ranks topped by `outer`, minus the straights among them
+        rank_sets = math.comb(outer - Card.Rank.TWO, 4)
+        rank_sets -= outer >= Card.Rank.SIX
+        rank_sets -= outer == Card.Rank.ACE
+        suit_combos = 4 if method == "_generate_flushes" else 4**5 - 4
+        return rank_sets * suit_combos
+
+    @staticmethod
+    def _outer_ranks(outer: Card.Rank | None) -> list[Card.Rank]:
+        if outer is None:
+            return list(reversed(Card.Rank))
+        return [outer]
 
     def generate_all_hands_in_order(self):
-        self._generate_straight_flushes()
-        self._generate_quads()
-        self._generate_full_houses()
-        self._generate_flushes()
-        self._generate_straights()
-        self._generate_trips()
-        self._generate_two_pairs()
-        self._generate_pairs()
-        self._generate_high_cards()
-
-    def bulk_write_hands_to_db(self) -> list[Hand]:
-        return Hand.objects.bulk_create(self.records)
+        self.records.extend(self.iter_all_hands())
+
+    def iter_all_hands(self) -> Iterator[Hand]:
+        for name, generate in self.categories:
+            with self.instrumentation.measure(name) as category:
+                for hand in generate():
+                    category.objects += 1
+                    yield hand
+
+    def bulk_write_hands_to_db(
+        self, batch_size: int = BATCH_SIZE
+    ) -> list[Hand]:
+        hands = []
+        for i, batch in enumerate(batched(self.records, batch_size)):
+            with self.instrumentation.measure(str(i), "batch") as measurement:
+                hands.extend(Hand.objects.bulk_create(batch))
+                measurement.objects = len(batch)
+        return hands
+
+    def stream_hands_to_db(
+        self, batch_size: int = BATCH_SIZE, packed: bool = False
+    ) -> int:
+        """Write every hand in batches of `batch_size`, never holding more
+        than one batch of unsaved Hand instances in memory. With `packed`,
+        hands are written to the single-key `PackedHand` table instead."""
+        measure = self.instrumentation.measure
+        total = 0
+        for name, generate in self.categories:
+            with measure(name) as category:
+                for i, batch in enumerate(batched(generate(), batch_size)):
+                    with measure(f"{name} {i}", "batch") as measurement:
+                        if packed:
+                            PackedHand.objects.bulk_create(
+                                PackedHand.from_hand(hand) for hand in batch
+                            )
+                        else:
+                            Hand.objects.bulk_create(batch)
+                        measurement.objects = len(batch)
+                    category.objects += len(batch)
+            total += category.objects
+        return total
+
+    def generate_in_parallel(
+        self,
+        workers: int | None = None,
+        batch_size: int = BATCH_SIZE,
+        units: list[tuple[str, Card.Rank | None, int]] | None = None,
+    ) -> int:
+        """Generate `units` (default: every work unit) in a process pool and
+        write the merged results in rank order from this process. At most
+        two units per worker are queued or finished but unwritten, so a
+        slow writer bounds how many generated rows are held in memory."""
+        cards = [
+            (card.id, card.rank, card.suit) for card in self.lookup.values()
+        ]
+        workers = workers or os.cpu_count() or 1
+        units = iter(self.work_units() if units is None else units)
+        total = 0
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(cards,)
+        ) as executor:
+            pending = collections.deque(
+                (queued, executor.submit(_generate_unit, queued))
+                for queued in itertools.islice(units, 2 * workers)
+            )
+            while pending:
+                (method, outer, _), future = pending.popleft()
+                rows = future.result()
+                # refill before writing, so workers stay busy meanwhile
+                if (queued := next(units, None)) is not None:
+                    pending.append(
+                        (queued, executor.submit(_generate_unit, queued))
+                    )
+                label = method if outer is None else f"{method}({outer.name})"
+                with self.instrumentation.measure(label, "unit") as unit:
+                    for batch in batched(rows, batch_size):
+                        Hand.objects.bulk_create(
+                            Hand(**dict(zip(HAND_ROW_FIELDS, row)))
+                            for row in batch
+                        )
+                    unit.objects = len(rows)
+                total += len(rows)
+                # free this unit's rows while waiting for the next
+                del rows
+        self.current_rank -= total
+        return total
+
+    def resume_to_db(
+        self,
+        batch_size: int = BATCH_SIZE,
+        units: list[tuple[str, Card.Rank | None, int]] | None = None,
+    ) -> int:
+        """Write `units` (default: every work unit) to the Hand table,
+        committing each batch together with its unit's checkpoint. Complete
+        units are skipped and a partly written one continues after its last
+        committed batch, so an interrupted run only needs to be rerun.
+        Returns the number of rows this run wrote."""
+        all_units = self.work_units()
+        ends = {
+            start_rank: end_rank
+            for (_, _, start_rank), (_, _, end_rank) in zip(
+                all_units, all_units[1:] + [(None, None, 0)]
+            )
+        }
+        total = 0
+        for method, outer, start_rank in all_units if units is None else units:
+            size = start_rank - ends[start_rank]
+            checkpoint, created = GenerationCheckpoint.objects.get_or_create(
+                start_rank=start_rank,
+                defaults={
+                    "method": method,
+                    "outer": outer,
+                    "size": size,
+                    "current_rank": start_rank,
+                },
+            )
+            if created:
+                # adopt or clear rows left by a run that kept no checkpoints
+                existing = Hand.objects.filter(
+                    rank__lte=start_rank, rank__gt=start_rank - size
+                )
+                if existing.count() == size:
+                    checkpoint.rows = size
+                    checkpoint.current_rank = start_rank - size
+                    checkpoint.save(update_fields=["rows", "current_rank"])
+                else:
+                    existing.delete()
+            if checkpoint.complete:
+                continue
+            self.current_rank = start_rank
+            generate = getattr(self, method)
+            hands = generate() if outer is None else generate(outer)
+            # generation is deterministic, so skip what is already written
+            hands = itertools.islice(hands, checkpoint.rows, None)
+            measure = self.instrumentation.measure
+            label = method if outer is None else f"{method}({outer.name})"
+            with measure(label, "unit") as unit:
+                for i, batch in enumerate(batched(hands, batch_size)):
+                    with measure(f"{label} {i}", "batch") as measurement:
+                        with transaction.atomic():
+                            Hand.objects.bulk_create(batch)
+                            checkpoint.rows += len(batch)
+                            checkpoint.current_rank = self.current_rank
+                            checkpoint.save(
+                                update_fields=["rows", "current_rank"]
+                            )
+                        measurement.objects = len(batch)
+                    unit.objects += len(batch)
+            total += unit.objects
+        return total
+
+    @classmethod
+    def verify_rank_coverage(cls) -> list[str]:
+        """Check that Hand.rank covers MAX_RANK down to 1 without gaps:
+        each distinct rank is shared by `count` hands, so the next rank
+        down must be `rank - count`, and the last one must reach 0.
+        Returns a description of every gap or overlap found."""
+        problems = []
+        expected = cls.MAX_RANK
+        counts = (
+            Hand.objects.values_list("rank")
+            .annotate(count=Count("id"))
+            .order_by("-rank")
+        )
+        for rank, count in counts:
+            if rank != expected:
+                problems.append(f"expected rank {expected}, found {rank}")
+            expected = rank - count
+        if expected > 0:
+            problems.append(f"ranks {expected} to 1 are missing")
+        elif expected < 0:
+            problems.append(f"the lowest ranks overshoot 0 by {-expected}")
+        return problems
+
+    @staticmethod
+    def _make_hand(hand_kwargs: dict) -> Hand:
+        hand = Hand(**hand_kwargs)
+        hand.card_mask = card_mask(hand.cards)
+        return hand
 
     def _generate_straight_flushes(self):
         # includes royal flushes
-        print(f"Straight Flushes start rank: {self.current_rank}")
+        logger.debug("Straight Flushes start rank: %d", self.current_rank)
         for rank in sorted(Card.Rank, reverse=True):
             count = 0
             if rank.value == 4:
@@ -60,7 +325,7 @@ class RankedHandsGenerator:
                     hand_kwargs["card5"] = self.lookup[(Card.Rank.ACE, suit)]
                     hand_kwargs["rank"] = self.current_rank
                     hand_kwargs["hand_type"] = Hand.HandType.STRAIGHT_FLUSH
-                    self.records.append(Hand(**hand_kwargs))
+                    yield self._make_hand(hand_kwargs)
                     count += 1
             else:
                 for suit in Card.Suit:
@@ -72,15 +337,15 @@ class RankedHandsGenerator:
                     }
                     hand_kwargs["rank"] = self.current_rank
                     hand_kwargs["hand_type"] = Hand.HandType.STRAIGHT_FLUSH
-                    self.records.append(Hand(**hand_kwargs))
+                    yield self._make_hand(hand_kwargs)
                     count += 1
 
             self.current_rank -= count
 
-        print(f"Straight Flushes end rank: {self.current_rank}")
+        logger.debug("Straight Flushes end rank: %d", self.current_rank)
 
     def _generate_quads(self):
-        print(f"Quads start rank: {self.current_rank}")
+        logger.debug("Quads start rank: %d", self.current_rank)
         for quad in sorted(Card.Rank, reverse=True):
             for kicker in sorted(Card.Rank, reverse=True):
                 if quad == kicker:
@@ -104,14 +369,14 @@ class RankedHandsGenerator:
                     }
                     hand_kwargs.update(quad_kwargs)
                     hand_kwargs["hand_type"] = Hand.HandType.QUADS
-                    self.records.append(Hand(**hand_kwargs))
+                    yield self._make_hand(hand_kwargs)
 
                 self.current_rank -= 4
 
-        print(f"Quads end rank: {self.current_rank}")
+        logger.debug("Quads end rank: %d", self.current_rank)
 
     def _generate_full_houses(self):
-        print(f"Full house start rank: {self.current_rank}")
+        logger.debug("Full house start rank: %d", self.current_rank)
         for trip in reversed(Card.Rank):
             for pair in reversed(Card.Rank):
                 if trip == pair:
@@ -138,14 +403,14 @@ class RankedHandsGenerator:
                         count += 1
                         hand_kwargs["hand_type"] = Hand.HandType.FULL_HOUSE
                         hand_kwargs["rank"] = self.current_rank
-                        self.records.append(Hand(**hand_kwargs))
+                        yield self._make_hand(hand_kwargs)
                 self.current_rank -= count
-        print(f"Full house end rank: {self.current_rank}")
+        logger.debug("Full house end rank: %d", self.current_rank)
 
-    def _generate_flushes(self):
-        print(f"Flush start rank: {self.current_rank}")
+    def _generate_flushes(self, outer: Card.Rank | None = None):
+        logger.debug("Flush start rank: %d", self.current_rank)
         hand_kwargs = {"hand_type": Hand.HandType.FLUSH}
-        for card5 in reversed(Card.Rank):
+        for card5 in self._outer_ranks(outer):
             for card4 in [r for r in reversed(Card.Rank) if r < card5]:
                 for card3 in [r for r in reversed(Card.Rank) if r < card4]:
                     for card2 in [r for r in reversed(Card.Rank) if r < card3]:
@@ -180,15 +445,15 @@ class RankedHandsGenerator:
                                     (card1, suit)
                                 ]
                                 hand_kwargs["rank"] = self.current_rank
-                                self.records.append(Hand(**hand_kwargs))
+                                yield self._make_hand(hand_kwargs)
                                 count += 1
 
                             self.current_rank -= count
 
-        print(f"Flush end rank: {self.current_rank}")
+        logger.debug("Flush end rank: %d", self.current_rank)
 
     def _generate_straights(self):
-        print(f"Straights start rank: {self.current_rank}")
+        logger.debug("Straights start rank: %d", self.current_rank)
         for rank in sorted(Card.Rank, reverse=True):
             count = 0
             if rank.value == 4:
@@ -208,7 +473,7 @@ class RankedHandsGenerator:
                     ]
                     hand_kwargs["rank"] = self.current_rank
                     hand_kwargs["hand_type"] = Hand.HandType.STRAIGHT
-                    self.records.append(Hand(**hand_kwargs))
+                    yield self._make_hand(hand_kwargs)
                     count += 1
             else:
                 for combo in itertools.product(Card.Suit, repeat=5):
@@ -222,14 +487,14 @@ class RankedHandsGenerator:
                     }
                     hand_kwargs["rank"] = self.current_rank
                     hand_kwargs["hand_type"] = Hand.HandType.STRAIGHT
-                    self.records.append(Hand(**hand_kwargs))
+                    yield self._make_hand(hand_kwargs)
                     count += 1
 
             self.current_rank -= count
-        print(f"Straights end rank: {self.current_rank}")
+        logger.debug("Straights end rank: %d", self.current_rank)
 
     def _generate_trips(self):
-        print(f"Trips start rank: {self.current_rank}")
+        logger.debug("Trips start rank: %d", self.current_rank)
         for trip in reversed(Card.Rank):
             for kicker1 in reversed(Card.Rank):
                 for kicker2 in reversed(Card.Rank):
@@ -269,15 +534,15 @@ class RankedHandsGenerator:
                                     (kicker2, kicker2_suit)
                                 ]
                                 hand_kwargs["rank"] = self.current_rank
-                                self.records.append(Hand(**hand_kwargs))
+                                yield self._make_hand(hand_kwargs)
                                 count += 1
 
                     self.current_rank -= count
 
-        print(f"Trips end rank: {self.current_rank}")
+        logger.debug("Trips end rank: %d", self.current_rank)
 
     def _generate_two_pairs(self):
-        print(f"Two Pair start rank: {self.current_rank}")
+        logger.debug("Two Pair start rank: %d", self.current_rank)
         for pair1 in reversed(Card.Rank):
             for pair2 in reversed(Card.Rank):
                 for kicker in reversed(Card.Rank):
@@ -316,15 +581,15 @@ class RankedHandsGenerator:
                                     (kicker, kicker_suit)
                                 ]
                                 hand_kwargs["rank"] = self.current_rank
-                                self.records.append(Hand(**hand_kwargs))
+                                yield self._make_hand(hand_kwargs)
                                 count += 1
                     self.current_rank -= count
 
-        print(f"Two pair end rank: {self.current_rank}")
+        logger.debug("Two pair end rank: %d", self.current_rank)
 
-    def _generate_pairs(self):
-        print(f"Pair start rank: {self.current_rank}")
-        for pair in reversed(Card.Rank):
+    def _generate_pairs(self, outer: Card.Rank | None = None):
+        logger.debug("Pair start rank: %d", self.current_rank)
+        for pair in self._outer_ranks(outer):
             for kicker1 in [r for r in reversed(Card.Rank) if r != pair]:
                 for kicker2 in [r for r in reversed(Card.Rank) if r < kicker1]:
                     for kicker3 in [
@@ -342,7 +607,7 @@ class RankedHandsGenerator:
                             kicker1_key = 5
                             kicker2_key = 2
                             kicker3_key = 1
-                        elif pair > kicker1:
+                        elif pair > kicker3:
                             pair_start = 3
                             kicker1_key = 5
                             kicker2_key = 4
@@ -376,14 +641,14 @@ class RankedHandsGenerator:
                                 ]
                                 hand_kwargs["rank"] = self.current_rank
                                 count += 1
-                                self.records.append(Hand(**hand_kwargs))
+                                yield self._make_hand(hand_kwargs)
                         self.current_rank -= count
-        print(f"Pair end rank: {self.current_rank}")
+        logger.debug("Pair end rank: %d", self.current_rank)
 
-    def _generate_high_cards(self):
-        print(f"High card start rank: {self.current_rank}")
+    def _generate_high_cards(self, outer: Card.Rank | None = None):
+        logger.debug("High card start rank: %d", self.current_rank)
         hand_kwargs = {"hand_type": Hand.HandType.HIGH_CARD}
-        for card5 in reversed(Card.Rank):
+        for card5 in self._outer_ranks(outer):
             for card4 in [r for r in reversed(Card.Rank) if r < card5]:
                 for card3 in [r for r in reversed(Card.Rank) if r < card4]:
                     for card2 in [r for r in reversed(Card.Rank) if r < card3]:
@@ -423,9 +688,42 @@ class RankedHandsGenerator:
                                     (card1, suit_combo[4])
                                 ]
                                 hand_kwargs["rank"] = self.current_rank
-                                self.records.append(Hand(**hand_kwargs))
+                                yield self._make_hand(hand_kwargs)
                                 count += 1
 
                             self.current_rank -= count
 
-        print(f"High card end rank: {self.current_rank}")
+        logger.debug("High card end rank: %d", self.current_rank)
+
+
+HAND_ROW_FIELDS = (
+    "card1_id",
+    "card2_id",
+    "card3_id",
+    "card4_id",
+    "card5_id",
+    "hand_type",
+    "rank",
+    "card_mask",
+)
+
+_worker_cards: list[Card] = []
+
+
+def _init_worker(cards: list[tuple[int, int, int]]):
+    django.setup()
+    _worker_cards[:] = [
+        Card(id=card_id, rank=rank, suit=suit) for card_id, rank, suit in cards
+    ]
+
+
+def _generate_unit(unit: tuple[str, Card.Rank | None, int]) -> list[tuple]:
+    method, outer, start_rank = unit
+    generator = RankedHandsGenerator(cards=_worker_cards)
+    generator.current_rank = start_rank
+    generate = getattr(generator, method)
+    hands = generate() if outer is None else generate(outer)
+    return [
+        tuple(getattr(hand, field) for field in HAND_ROW_FIELDS)
+        for hand in hands
+    ]
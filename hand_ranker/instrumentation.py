@@ -0,0 +1,152 @@
+"""Timing and memory measurements for hand generation.
+
+`Instrumentation.measure` wraps a category, unit or batch of work and
+records its wall and CPU time, how many objects it produced and the
+process's memory high-water mark, optionally with tracemalloc's peak for
+just that section. Each measurement is logged and passed to any metrics
+callbacks; cProfile can run over every measured section.
+"""
+
+import cProfile
+import io
+import logging
+import pstats
+import resource
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable
+from collections.abc import Iterable
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from dataclasses import field
+
+logger = logging.getLogger(__name__)
+
+# ru_maxrss is in bytes on macOS and kibibytes elsewhere
+_RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+@dataclass
+class Measurement:
+    name: str
+    # "category", "unit" or "batch"
+    kind: str
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    objects: int = 0
+    max_rss_bytes: int = 0
+    # tracemalloc's peak within the section, when tracing memory
+    traced_peak_bytes: int | None = None
+
+    @property
+    def objects_per_sec(self) -> float:
+        return self.objects / self.wall_seconds if self.wall_seconds else 0.0
+
+    def __str__(self) -> str:
+        text = (
+            f"{self.kind} {self.name}: {self.objects:,} objects in "
+            f"{self.wall_seconds:.2f}s wall, {self.cpu_seconds:.2f}s CPU "
+            f"({self.objects_per_sec:,.0f}/sec), "
+            f"max RSS {self.max_rss_bytes / 2**20:,.1f} MiB"
+        )
+        if self.traced_peak_bytes is not None:
+            text += f", traced peak {self.traced_peak_bytes / 2**20:,.1f} MiB"
+        return text
+
+
+@dataclass
+class Instrumentation:
+    """Measures sections of work, which may nest. Category and unit
+    measurements are logged at `level` and batches one level lower; every
+    measurement also goes to each of the `callbacks`."""
+
+    callbacks: Iterable[Callable[[Measurement], None]] = ()
+    level: int = logging.INFO
+    profile: bool = False
+    trace_memory: bool = False
+    measurements: list[Measurement] = field(default_factory=list)
+
+    def __post_init__(self):
+        self.profiler = cProfile.Profile() if self.profile else None
+        # banked tracemalloc peaks of the open sections, outermost first
+        self._open_peaks: list[int] = []
+        self._started_tracing = False
+
+    @contextmanager
+    def measure(
+        self, name: str, kind: str = "category"
+    ) -> Iterator[Measurement]:
+        """Measure the enclosed block. The caller sets or increments the
+        yielded measurement's `objects`."""
+        measurement = Measurement(name, kind)
+        outermost = not self._open_peaks
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            elif self._open_peaks:
+                self._open_peaks[-1] = max(
+                    self._open_peaks[-1], tracemalloc.get_traced_memory()[1]
+                )
+            tracemalloc.reset_peak()
+        self._open_peaks.append(0)
+        if self.profiler is not None and outermost:
+            self.profiler.enable()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield measurement
+        finally:
+            measurement.wall_seconds = time.perf_counter() - wall
+            measurement.cpu_seconds = time.process_time() - cpu
+            if self.profiler is not None and outermost:
+                self.profiler.disable()
+            peak = self._open_peaks.pop()
+            if self.trace_memory:
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+                measurement.traced_peak_bytes = peak
+                if self._open_peaks:
+                    self._open_peaks[-1] = max(self._open_peaks[-1], peak)
+                elif self._started_tracing:
+                    tracemalloc.stop()
+                    self._started_tracing = False
+            measurement.max_rss_bytes = (
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _RSS_UNIT
+            )
+            self.record(measurement)
+
+    def record(self, measurement: Measurement):
+        self.measurements.append(measurement)
+        level = self.level if measurement.kind != "batch" else self.level - 10
+        logger.log(level, "%s", measurement)
+        for callback in self.callbacks:
+            callback(measurement)
+
+    def profile_stats(self, sort: str = "cumulative", limit: int = 30) -> str:
+        if self.profiler is None:
+            return ""
+        output = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=output)
+        stats.sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+
+def add_arguments(parser):
+    """Add --profile and --trace-memory to a management command."""
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Run cProfile over generation and print the top functions",
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="Record tracemalloc's peak for each category and batch",
+    )
+
+
+def from_options(options: dict) -> Instrumentation:
+    return Instrumentation(
+        profile=options["profile"], trace_memory=options["trace_memory"]
+    )
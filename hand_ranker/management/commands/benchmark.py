@@ -0,0 +1,106 @@
+import json
+import platform
+from pathlib import Path
+
+import django
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from hand_ranker.benchmarks import BENCHMARKS
+from hand_ranker.benchmarks import REPEAT
+from hand_ranker.benchmarks import compare
+from hand_ranker.benchmarks import run_benchmark
+
+
+class Command(BaseCommand):
+    help = "Run hand ranking micro-benchmarks."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "names",
+            nargs="*",
+            help=f"Benchmarks to run (default: all of {', '.join(BENCHMARKS)})",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=REPEAT,
+            help="Timed runs per benchmark",
+        )
+        parser.add_argument(
+            "--no-memory",
+            action="store_true",
+            help="Skip the tracemalloc run that measures peak memory",
+        )
+        parser.add_argument(
+            "--json",
+            type=Path,
+            help="Write the results as JSON to this file",
+        )
+        parser.add_argument(
+            "--baseline",
+            type=Path,
+            help="Compare against results previously written with --json",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.1,
+            help="Slowdown against the baseline to fail on (default: 0.1)",
+        )
+
+    def handle(self, *args, **options):
+        names = options["names"] or list(BENCHMARKS)
+        unknown = set(names) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError(f"Unknown benchmarks: {', '.join(unknown)}")
+        baseline = None
+        if options["baseline"]:
+            baseline = json.loads(options["baseline"].read_text())["results"]
+
+        results = {}
+        for name in names:
+            try:
+                result = run_benchmark(
+                    name, options["repeat"], not options["no_memory"]
+                )
+            except FileNotFoundError as e:
+                self.stderr.write(f"{name}: skipped ({e})")
+                continue
+            results[name] = result
+            memory = result["peak_memory_bytes"]
+            self.stdout.write(
+                f"{name}: {result['ops']:,} ops in {result['seconds']:.2f}s "
+                f"({result['ops_per_sec']:,.0f} ops/sec, "
+                f"p90 {result['p90_seconds']:.2f}s"
+                + (f", peak {memory / 2**20:,.1f} MiB)" if memory else ")")
+            )
+
+        if options["json"]:
+            options["json"].write_text(
+                json.dumps(
+                    {
+                        "python": platform.python_version(),
+                        "django": django.get_version(),
+                        "machine": platform.machine(),
+                        "results": results,
+                    },
+                    indent=2,
+                )
+            )
+            self.stdout.write(f"Wrote {options['json']}")
+
+        if baseline is not None:
+            rows = compare(results, baseline, options["tolerance"])
+            for row in rows:
+                self.stdout.write(
+                    f"{row['name']}: {row['change']:+.1%} "
+                    f"({row['baseline_ops_per_sec']:,.0f} -> "
+                    f"{row['ops_per_sec']:,.0f} ops/sec)"
+                    + (" REGRESSION" if row["regression"] else "")
+                )
+            regressions = [row["name"] for row in rows if row["regression"]]
+            if regressions:
+                raise CommandError(
+                    f"Slower than baseline: {', '.join(regressions)}"
+                )
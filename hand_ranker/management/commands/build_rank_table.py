@@ -0,0 +1,38 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from hand_ranker import rank_table
+
+
+class Command(BaseCommand):
+    help = "Export Hand.rank to a memory-mappable 5-card lookup table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            type=Path,
+            default=None,
+            help="Output file (default: settings.HAND_RANK_TABLE)",
+        )
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Check an existing table against the Hand table instead",
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        if options["verify"]:
+            table = rank_table.RankTable(options["path"])
+            if not table.verify():
+                raise CommandError(f"{table.path} is corrupt")
+            if not table.verify_against_database():
+                raise CommandError(f"{table.path} is out of date")
+            self.stdout.write(f"{table.path} matches the Hand table")
+        else:
+            path = rank_table.build(options["path"])
+            self.stdout.write(f"Wrote {path}")
+        self.stdout.write(f"Took {time.perf_counter() - start:.2f}s")
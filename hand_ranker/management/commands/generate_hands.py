@@ -0,0 +1,66 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from hand_ranker import instrumentation
+from hand_ranker.generate import CardGenerator
+from hand_ranker.generate import RankedHandsGenerator
+from hand_ranker.models import Card
+from hand_ranker.models import GenerationCheckpoint
+from hand_ranker.models import Hand
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate every ranked hand into the Hand table, continuing from the "
+        "last checkpoint, then check that the ranks are contiguous."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=RankedHandsGenerator.BATCH_SIZE,
+            help="Rows per committed batch",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Delete all hands and checkpoints and start over",
+        )
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Only check the rank coverage of the Hand table",
+        )
+        instrumentation.add_arguments(parser)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        if not options["verify"]:
+            if options["restart"]:
+                GenerationCheckpoint.objects.all().delete()
+                Hand.objects.all().delete()
+            if not Card.objects.exists():
+                CardGenerator().create_deck()
+            done = sum(
+                checkpoint.rows
+                for checkpoint in GenerationCheckpoint.objects.all()
+            )
+            if done:
+                self.stdout.write(f"Resuming after {done} committed hands")
+            tracker = instrumentation.from_options(options)
+            generator = RankedHandsGenerator(instrumentation=tracker)
+            written = generator.resume_to_db(options["batch_size"])
+            self.stdout.write(f"Wrote {written} hands")
+            if tracker.profile:
+                self.stdout.write(tracker.profile_stats())
+
+        problems = RankedHandsGenerator.verify_rank_coverage()
+        if problems:
+            raise CommandError("\n".join(problems))
+        self.stdout.write(
+            f"Ranks are contiguous from {RankedHandsGenerator.MAX_RANK} to 1"
+        )
+        self.stdout.write(f"Took {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,166 @@
+import time
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db import transaction
+
+from hand_ranker import evaluator
+from hand_ranker import instrumentation
+from hand_ranker.generate import CardGenerator
+from hand_ranker.generate import RankedHandsGenerator
+from hand_ranker.generate import batched
+from hand_ranker.models import Card
+from hand_ranker.models import Hand
+from hand_ranker.models import HandClass
+from hand_ranker.models import PackedHand
+
+# bulk-load settings, restored once the load is done
+PRAGMAS = {
+    "journal_mode": "MEMORY",
+    "synchronous": "OFF",
+    "cache_size": -262_144,  # 256 MiB
+    "temp_store": "MEMORY",
+}
+
+
+class Command(BaseCommand):
+    help = "Load every ranked hand straight into SQLite in one transaction."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=RankedHandsGenerator.BATCH_SIZE,
+            help="Rows per executemany call",
+        )
+        table = parser.add_mutually_exclusive_group()
+        table.add_argument(
+            "--packed",
+            action="store_true",
+            help="Seed the PackedHand table instead of Hand",
+        )
+        table.add_argument(
+            "--classes",
+            action="store_true",
+            help="Seed the HandClass table, one row per strength class",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Reload even if the table is already complete",
+        )
+        instrumentation.add_arguments(parser)
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("seed_hands only supports SQLite")
+        if options["packed"]:
+            model, size = PackedHand, RankedHandsGenerator.MAX_RANK
+        elif options["classes"]:
+            model, size = HandClass, len(evaluator.strength_classes())
+        else:
+            model, size = Hand, RankedHandsGenerator.MAX_RANK
+        table = model._meta.db_table
+
+        with self.phase("cards"):
+            if not Card.objects.exists():
+                CardGenerator().create_deck()
+
+        count = model.objects.count()
+        if count == size and not options["force"]:
+            self.stdout.write(f"{table} already holds {count} rows")
+            return
+
+        tracker = instrumentation.from_options(options)
+        connection.ensure_connection()
+        with self.pragmas(PRAGMAS):
+            with transaction.atomic():
+                with self.phase("drop indexes"):
+                    indexes = self.drop_indexes(table)
+                with self.phase("clear"):
+                    model.objects.all().delete()
+                with self.phase("load"):
+                    rows = self.load(model, options["batch_size"], tracker)
+                with self.phase("rebuild indexes"):
+                    with connection.cursor() as cursor:
+                        for sql in indexes:
+                            cursor.execute(sql)
+        self.stdout.write(f"Seeded {rows} rows into {table}")
+        if tracker.profile:
+            self.stdout.write(tracker.profile_stats())
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        yield
+        self.stdout.write(f"{name}: {time.perf_counter() - start:.2f}s")
+
+    @contextmanager
+    def pragmas(self, pragmas: dict):
+        with connection.cursor() as cursor:
+            previous = {
+                name: cursor.execute(f"PRAGMA {name}").fetchone()[0]
+                for name in pragmas
+            }
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+        try:
+            yield
+        finally:
+            with connection.cursor() as cursor:
+                for name, value in previous.items():
+                    cursor.execute(f"PRAGMA {name} = {value}")
+
+    def drop_indexes(self, table: str) -> list[str]:
+        """Drop the table's explicit indexes and return the SQL to rebuild
+        them. Indexes SQLite creates for inline UNIQUE constraints cannot be
+        dropped and are kept."""
+        with connection.cursor() as cursor:
+            indexes = cursor.execute(
+                "SELECT name, sql FROM sqlite_master "
+                "WHERE type = 'index' AND tbl_name = %s AND sql IS NOT NULL",
+                [table],
+            ).fetchall()
+            for name, _ in indexes:
+                cursor.execute(f'DROP INDEX "{name}"')
+        return [sql for _, sql in indexes]
+
+    def load(
+        self,
+        model: type[Hand | PackedHand | HandClass],
+        batch_size: int,
+        tracker: instrumentation.Instrumentation,
+    ) -> int:
+        fields = [
+            field
+            for field in model._meta.concrete_fields
+            if not field.auto_created
+        ]
+        columns = ", ".join(f'"{field.column}"' for field in fields)
+        placeholders = ", ".join("?" for _ in fields)
+        sql = (
+            f'INSERT INTO "{model._meta.db_table}" ({columns}) '
+            f"VALUES ({placeholders})"
+        )
+        if model is HandClass:
+            hands = map(HandClass.from_strength, evaluator.strength_classes())
+        else:
+            generator = RankedHandsGenerator(instrumentation=tracker)
+            hands = generator.iter_all_hands()
+        if model is PackedHand:
+            hands = map(PackedHand.from_hand, hands)
+        # the underlying sqlite3 connection, skipping Django's cursor wrapper
+        raw_connection = connection.connection
+        rows = 0
+        for batch in batched(hands, batch_size):
+            raw_connection.executemany(
+                sql,
+                [
+                    [getattr(hand, field.attname) for field in fields]
+                    for hand in batch
+                ],
+            )
+            rows += len(batch)
+        return rows
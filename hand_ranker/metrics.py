@@ -0,0 +1,351 @@
+"""Per-endpoint request metrics, served as text by `views.metrics`.
+
+`MetricsMiddleware` times each request and, through a database execute
+wrapper installed on every connection, counts its queries and their time;
+`ResultCache` lookups count its cache hits and misses. The request's
+totals live in a context variable, so queries run by `sync_to_async` and
+cache lookups made while a response streams are counted too. A streaming
+response is recorded once its last chunk has been sent.
+
+Recording a request costs a few counter updates under one lock, so the
+middleware can stay on under load.
+"""
+
+import bisect
+import threading
+import time
+from collections.abc import AsyncIterator
+from collections.abc import Iterator
+from collections.abc import Mapping
+from contextvars import ContextVar
+from dataclasses import dataclass
+from dataclasses import field
+
+from asgiref.sync import iscoroutinefunction
+from asgiref.sync import markcoroutinefunction
+from django.http import HttpRequest
+from django.http import HttpResponseBase
+
+# upper bounds of the latency histogram's buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# requests that match no URL share one endpoint, so the number of series
+# stays bounded whatever paths clients send
+UNRESOLVED = "unresolved"
+
+
+@dataclass
+class RequestMetrics:
+    """What one request has done so far."""
+
+    start: float = field(default_factory=time.perf_counter)
+    queries: int = 0
+    db_seconds: float = 0.0
+    cache_hits: int = 0
+    cache_misses: int = 0
+
+
+@dataclass
+class EndpointStats:
+    requests: int = 0
+    # responses with a 5xx status
+    errors: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+    queries: int = 0
+    db_seconds: float = 0.0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    # requests per latency bucket, the last for those over every bound
+    latency_counts: list[int] = field(
+        default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1)
+    )
+
+    @property
+    def cache_hit_rate(self) -> float:
+        lookups = self.cache_hits + self.cache_misses
+        return self.cache_hits / lookups if lookups else 0.0
+
+
+_current: ContextVar[RequestMetrics | None] = ContextVar(
+    "hand_ranker_request_metrics", default=None
+)
+
+
+def time_query(execute, sql, params, many, context):
+    """Database execute wrapper adding each query to the current request."""
+    request_metrics = _current.get()
+    if request_metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        request_metrics.queries += 1
+        request_metrics.db_seconds += time.perf_counter() - start
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """`connection_created` receiver. The wrapper goes innermost, so it
+    only times the database, and `connection.execute_wrapper` blocks
+    still pop their own wrappers."""
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, time_query)
+
+
+def count_cache_lookup(hit: bool):
+    request_metrics = _current.get()
+    if request_metrics is not None:
+        if hit:
+            request_metrics.cache_hits += 1
+        else:
+            request_metrics.cache_misses += 1
+
+
+class MetricsRegistry:
+    """Thread-safe totals per endpoint, named by URL pattern name."""
+
+    def __init__(self):
+        self._endpoints: dict[str, EndpointStats] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self, endpoint: str, status: int, request_metrics: RequestMetrics
+    ):
+        seconds = time.perf_counter() - request_metrics.start
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = EndpointStats()
+            stats.requests += 1
+            stats.errors += status >= 500
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            stats.queries += request_metrics.queries
+            stats.db_seconds += request_metrics.db_seconds
+            stats.cache_hits += request_metrics.cache_hits
+            stats.cache_misses += request_metrics.cache_misses
+            stats.latency_counts[bucket] += 1
+
+    def snapshot(self) -> dict[str, EndpointStats]:
+        with self._lock:
+            return {
+                endpoint: EndpointStats(
+                    **{
+                        **vars(stats),
+                        "latency_counts": list(stats.latency_counts),
+                    }
+                )
+                for endpoint, stats in self._endpoints.items()
+            }
+
+    def clear(self):
+        with self._lock:
+            self._endpoints.clear()
+
+    def render(self, caches: Mapping[str, dict] = {}) -> str:
+        """The totals in Prometheus' text format, with the `ResultCache.stats`
+        of each of `caches` by name."""
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f"# HELP hand_ranker_{name} {help_text}")
+            lines.append(f"# TYPE hand_ranker_{name} {kind}")
+            for suffix, labels, value in samples:
+                label_text = ",".join(
+                    f'{label}="{_escape(text)}"' for label, text in labels
+                )
+                lines.append(
+                    f"hand_ranker_{name}{suffix}{{{label_text}}} {value}"
+                )
+
+        endpoints = sorted(self.snapshot().items())
+
+        def per_endpoint(attribute):
+            return [
+                ("", [("endpoint", endpoint)], getattr(stats, attribute))
+                for endpoint, stats in endpoints
+            ]
+
+        family(
+            "requests_total",
+            "counter",
+            "Requests served.",
+            per_endpoint("requests"),
+        )
+        family(
+            "request_errors_total",
+            "counter",
+            "Responses with a 5xx status.",
+            per_endpoint("errors"),
+        )
+        latency = []
+        for endpoint, stats in endpoints:
+            total = 0
+            for bound, count in zip(
+                (*LATENCY_BUCKETS, "+Inf"), stats.latency_counts
+            ):
+                total += count
+                latency.append(
+                    (
+                        "_bucket",
+                        [("endpoint", endpoint), ("le", str(bound))],
+                        total,
+                    )
+                )
+            latency.append(("_sum", [("endpoint", endpoint)], stats.seconds))
+            latency.append(("_count", [("endpoint", endpoint)], stats.requests))
+        family(
+            "request_seconds",
+            "histogram",
+            "Request latency, to the last chunk for streaming responses.",
+            latency,
+        )
+        family(
+            "request_max_seconds",
+            "gauge",
+            "Slowest request.",
+            per_endpoint("max_seconds"),
+        )
+        family(
+            "db_queries_total",
+            "counter",
+            "Database queries run while serving requests.",
+            per_endpoint("queries"),
+        )
+        family(
+            "db_seconds_total",
+            "counter",
+            "Time spent in those queries.",
+            per_endpoint("db_seconds"),
+        )
+        family(
+            "endpoint_cache_hits_total",
+            "counter",
+            "Result cache hits while serving requests.",
+            per_endpoint("cache_hits"),
+        )
+        family(
+            "endpoint_cache_misses_total",
+            "counter",
+            "Result cache misses while serving requests.",
+            per_endpoint("cache_misses"),
+        )
+        family(
+            "endpoint_cache_hit_ratio",
+            "gauge",
+            "Share of result cache lookups that hit.",
+            per_endpoint("cache_hit_rate"),
+        )
+        caches = sorted(caches.items())
+        for key, kind, help_text in (
+            ("size", "gauge", "Entries held by this process."),
+            ("hits", "counter", "Hits, including from the shared backend."),
+            ("misses", "counter", "Misses."),
+            ("evictions", "counter", "Entries evicted."),
+            ("hit_rate", "gauge", "Share of lookups that hit."),
+        ):
+            family(
+                f"cache_{key}",
+                kind,
+                f"Result cache: {help_text}",
+                [("", [("cache", name)], stats[key]) for name, stats in caches],
+            )
+        return "\n".join(lines) + "\n"
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+registry = MetricsRegistry()
+
+
+def endpoint_name(request: HttpRequest) -> str:
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match is not None else UNRESOLVED
+
+
+class MetricsMiddleware:
+    """Record each request's latency, queries and cache lookups under its
+    endpoint in `registry`. Works with sync and async views."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest):
+        if self.async_mode:
+            return self.__acall__(request)
+        request_metrics = RequestMetrics()
+        token = _current.set(request_metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, request_metrics)
+
+    async def __acall__(self, request: HttpRequest):
+        request_metrics = RequestMetrics()
+        token = _current.set(request_metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, request_metrics)
+
+    def finish(
+        self,
+        request: HttpRequest,
+        response: HttpResponseBase,
+        request_metrics: RequestMetrics,
+    ) -> HttpResponseBase:
+        endpoint = endpoint_name(request)
+        if not response.streaming:
+            registry.record(endpoint, response.status_code, request_metrics)
+            return response
+
+        def done():
+            registry.record(endpoint, response.status_code, request_metrics)
+
+        content = response.streaming_content
+        if response.is_async:
+            response.streaming_content = _astream(
+                content, request_metrics, done
+            )
+        else:
+            response.streaming_content = _stream(content, request_metrics, done)
+        return response
+
+
+# The stream is consumed after the middleware has returned, by whichever
+# task or thread sends it, so it sets the request's metrics itself. The
+# variable is cleared rather than reset, as a stream abandoned by its
+# client may be closed from another context.
+
+
+def _stream(content: Iterator, request_metrics: RequestMetrics, done):
+    _current.set(request_metrics)
+    try:
+        yield from content
+    finally:
+        _current.set(None)
+        done()
+
+
+async def _astream(
+    content: AsyncIterator, request_metrics: RequestMetrics, done
+):
+    _current.set(request_metrics)
+    try:
+        async for chunk in content:
+            yield chunk
+    finally:
+        _current.set(None)
+        done()
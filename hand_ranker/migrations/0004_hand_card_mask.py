@@ -0,0 +1,57 @@
+# Generated by Django 5.1.2 on 2026-10-18 21:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("hand_ranker", "0003_alter_hand_hand_type_alter_hand_rank"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="hand",
+            name="hand_type",
+            field=models.IntegerField(
+                choices=[
+                    (9, "Straight Flush"),
+                    (8, "Quads"),
+                    (7, "Full House"),
+                    (6, "Flush"),
+                    (5, "Straight"),
+                    (4, "Trips"),
+                    (3, "Two Pair"),
+                    (2, "Pair"),
+                    (1, "High Card"),
+                ],
+                db_index=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="hand",
+            name="card_mask",
+            field=models.BigIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE hand_ranker_hand SET card_mask = (
+                    SELECT SUM(1 << ((card.rank - 2) * 4 + card.suit - 1))
+                    FROM hand_ranker_card card
+                    WHERE card.id IN (
+                        hand_ranker_hand.card1_id,
+                        hand_ranker_hand.card2_id,
+                        hand_ranker_hand.card3_id,
+                        hand_ranker_hand.card4_id,
+                        hand_ranker_hand.card5_id
+                    )
+                )
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name="hand",
+            name="card_mask",
+            field=models.BigIntegerField(unique=True),
+        ),
+    ]
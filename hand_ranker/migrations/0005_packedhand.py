@@ -0,0 +1,43 @@
+# Generated by Django 5.1.2 on 2026-10-18 21:19
+
+from django.db import migrations, models
+
+BATCH_SIZE = 10_000
+
+
+def pack_hands(apps, schema_editor):
+    Hand = apps.get_model("hand_ranker", "Hand")
+    PackedHand = apps.get_model("hand_ranker", "PackedHand")
+    batch = []
+    for card_mask, rank in Hand.objects.values_list(
+        "card_mask", "rank"
+    ).iterator(chunk_size=BATCH_SIZE):
+        key = 0
+        for code in reversed(range(card_mask.bit_length())):
+            if card_mask >> code & 1:
+                key = key << 6 | code
+        batch.append(PackedHand(key=key, rank=rank))
+        if len(batch) == BATCH_SIZE:
+            PackedHand.objects.bulk_create(batch)
+            batch = []
+    PackedHand.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("hand_ranker", "0004_hand_card_mask"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PackedHand",
+            fields=[
+                (
+                    "key",
+                    models.IntegerField(primary_key=True, serialize=False),
+                ),
+                ("rank", models.PositiveIntegerField(db_index=True)),
+            ],
+        ),
+        migrations.RunPython(pack_hands, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.2 on 2026-10-18 21:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hand_ranker", "0005_packedhand"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GenerationCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("start_rank", models.PositiveIntegerField(unique=True)),
+                ("method", models.CharField(max_length=32)),
+                (
+                    "outer",
+                    models.IntegerField(
+                        choices=[
+                            (2, "Two"),
+                            (3, "Three"),
+                            (4, "Four"),
+                            (5, "Five"),
+                            (6, "Six"),
+                            (7, "Seven"),
+                            (8, "Eight"),
+                            (9, "Nine"),
+                            (10, "Ten"),
+                            (11, "Jack"),
+                            (12, "Queen"),
+                            (13, "King"),
+                            (14, "Ace"),
+                        ],
+                        null=True,
+                    ),
+                ),
+                ("size", models.PositiveIntegerField()),
+                ("rows", models.PositiveIntegerField(default=0)),
+                ("current_rank", models.PositiveIntegerField()),
+            ],
+        ),
+    ]
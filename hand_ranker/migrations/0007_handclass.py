@@ -0,0 +1,21 @@
+# Generated by Django 5.1.2 on 2026-10-18 22:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hand_ranker", "0006_generationcheckpoint"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HandClass",
+            fields=[
+                ("key", models.IntegerField(primary_key=True, serialize=False)),
+                ("rank", models.PositiveIntegerField(unique=True)),
+                ("combos", models.PositiveIntegerField()),
+            ],
+        ),
+    ]
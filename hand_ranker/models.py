@@ -1,7 +1,21 @@
+from django.conf import settings
 from django.db import models
+from django.db.models import F
 from django.db.models import Q
 from django.db.models import QuerySet
+from django.db.models.fields.related_descriptors import (
+    ForwardManyToOneDescriptor,
+)
 from collections import Counter
+from collections.abc import Iterable
+from collections.abc import Sequence
+from functools import cached_property
+from typing import TYPE_CHECKING
+
+from .cards import encode
+
+if TYPE_CHECKING:
+    from .evaluator import StrengthClass
 
 # Create your models here.
 
@@ -45,19 +59,162 @@ class Card(models.Model):
     def __lt__(self, other: "Card") -> bool:
         return self.rank < other.rank
 
+    @property
+    def code(self) -> int:
+        return encode(self.rank, self.suit)
+
     @property
     def all_hands(self) -> QuerySet["Hand"]:
-        Hand.objects.filter(
-            Q(card5=self)
-            | Q(card4=self)
-            | Q(card3=self)
-            | Q(card2=self)
-            | Q(card1=self)
+        return Hand.objects.containing([self])
+
+
+def card_mask(cards: Iterable[Card | int]) -> int:
+    """One bit per card code, for `Card`s or codes."""
+    mask = 0
+    for card in cards:
+        mask |= 1 << (card.code if isinstance(card, Card) else int(card))
+    return mask
+
+
+class CardRegistry:
+    """The 52 `Card` rows indexed by id, (rank, suit) and card code."""
+
+    def __init__(self, cards: Iterable[Card]):
+        self.cards = sorted(cards, key=lambda card: card.code)
+        self.by_id = {card.id: card for card in self.cards}
+        self.by_rank_suit = {
+            (card.rank, card.suit): card for card in self.cards
+        }
+        self.by_code = {card.code: card for card in self.cards}
+        self.codes = tuple(self.by_code)
+
+
+_card_registry: CardRegistry | None = None
+
+
+def card_registry() -> CardRegistry:
+    """Return the process-wide `CardRegistry`, querying `Card` only once."""
+    global _card_registry
+    if _card_registry is None:
+        cards = list(Card.objects.all())
+        if len(cards) != 52:
+            raise ValueError(f"Expected 52 cards, found {len(cards)}")
+        _card_registry = CardRegistry(cards)
+    return _card_registry
+
+
+def reset_card_registry():
+    global _card_registry
+    _card_registry = None
+
+
+class CardDescriptor(ForwardManyToOneDescriptor):
+
+    def get_object(self, instance: models.Model) -> Card:
+        return card_registry().by_id[getattr(instance, self.field.attname)]
+
+
+class CardForeignKey(models.ForeignKey):
+    """A ForeignKey to `Card` that loads the related card from the card
+    registry instead of the database."""
+
+    forward_related_accessor_class = CardDescriptor
+
+    def deconstruct(self):
+        name, _, args, kwargs = super().deconstruct()
+        return name, "django.db.models.ForeignKey", args, kwargs
+
+
+def _five_card_mask(cards: Iterable[Card | int]) -> int:
+    mask = card_mask(cards)
+    if mask.bit_count() != 5:
+        raise ValueError("A hand is made of five different cards")
+    return mask
+
+
+class HandQuerySet(models.QuerySet):
+
+    def with_cards(self, cards: Iterable[Card | int]) -> QuerySet["Hand"]:
+        """The hand made of exactly these five cards, in any order."""
+        return self.filter(card_mask=card_mask(cards))
+
+    # SQLite 3.32+ allows 32,766 parameters per statement
+    LOOKUP_BATCH_SIZE = 30_000
+
+    def _from_classes(self) -> bool:
+        # a filtered queryset must see the Hand rows themselves
+        return (
+            settings.HAND_RANKER_HAND_STORE == "classes"
+            and not self.query.has_filters()
+        )
+
+    def lookup(self, cards: Iterable[Card | int]) -> "Hand":
+        """The hand made of these five cards, given in any order. With
+        `settings.HAND_RANKER_HAND_STORE` set to "classes" the rank comes
+        from `HandClass` and the hand is not saved."""
+        if self._from_classes():
+            cards = list(cards)
+            return Hand.from_class(cards, HandClass.objects.lookup(cards))
+        return self.get(card_mask=_five_card_mask(cards))
+
+    def lookup_many(
+        self,
+        card_sets: Iterable[Iterable[Card | int]],
+        batch_size: int = LOOKUP_BATCH_SIZE,
+    ) -> list["Hand"]:
+        """The hand for each card set, in order, resolving up to
+        `batch_size` distinct hands per query."""
+        if self._from_classes():
+            card_sets = [list(cards) for cards in card_sets]
+            hand_classes = HandClass.objects.lookup_many(card_sets, batch_size)
+            return [
+                Hand.from_class(cards, hand_class)
+                for cards, hand_class in zip(card_sets, hand_classes)
+            ]
+        masks = [_five_card_mask(cards) for cards in card_sets]
+        unique_masks = list(dict.fromkeys(masks))
+        hands = {}
+        for start in range(0, len(unique_masks), batch_size):
+            batch = unique_masks[start : start + batch_size]
+            for hand in self.filter(card_mask__in=batch):
+                hands[hand.card_mask] = hand
+        missing = len(unique_masks) - len(hands)
+        if missing:
+            raise self.model.DoesNotExist(f"{missing} hands were not found")
+        return [hands[mask] for mask in masks]
+
+    def containing(self, cards: Iterable[Card | int]) -> QuerySet["Hand"]:
+        """Hands holding all of these cards. SQLite cannot index a bitwise
+        AND, so the indexed card columns first narrow the search to hands
+        with the first card, then the mask checks the rest. A single card,
+        as for `Card.all_hands`, needs only the card columns: the mask
+        alone would scan the whole table, about three times slower. No
+        cards leave the queryset unfiltered, as every hand holds them."""
+        cards = list(cards)
+        if not cards:
+            return self.all()
+        first = cards[0]
+        if not isinstance(first, Card):
+            first = card_registry().by_code[first]
+        hands = self.filter(
+            Q(card1=first)
+            | Q(card2=first)
+            | Q(card3=first)
+            | Q(card4=first)
+            | Q(card5=first)
+        )
+        if len(cards) == 1:
+            return hands
+        mask = card_mask(cards)
+        return hands.alias(matched_cards=F("card_mask").bitand(mask)).filter(
+            matched_cards=mask
         )
 
 
 class Hand(models.Model):
 
+    objects = HandQuerySet.as_manager()
+
     class Meta:
         unique_together = (
             (
@@ -69,19 +226,19 @@ class Hand(models.Model):
             ),
         )
 
-    card1 = models.ForeignKey(
+    card1 = CardForeignKey(
         Card, on_delete=models.CASCADE, related_name="hand1s"
     )
-    card2 = models.ForeignKey(
+    card2 = CardForeignKey(
         Card, on_delete=models.CASCADE, related_name="hand2s"
     )
-    card3 = models.ForeignKey(
+    card3 = CardForeignKey(
         Card, on_delete=models.CASCADE, related_name="hand3s"
     )
-    card4 = models.ForeignKey(
+    card4 = CardForeignKey(
         Card, on_delete=models.CASCADE, related_name="hand4s"
     )
-    card5 = models.ForeignKey(
+    card5 = CardForeignKey(
         Card, on_delete=models.CASCADE, related_name="hand5s"
     )
 
@@ -101,9 +258,72 @@ class Hand(models.Model):
 
     rank = models.PositiveIntegerField(db_index=True)
 
+    # bit `Card.code` is set for each of the five cards
+    card_mask = models.BigIntegerField(unique=True)
+
     def __str__(self) -> str:
         return f"{self.HandType(self.hand_type).name} (rank: {self.rank}): {self.card5} {self.card4} {self.card3} {self.card2} {self.card1}"
 
+    # `rank` totally orders hands by strength, so comparisons never need
+    # the comparison array. Equality is left to Model, which compares
+    # primary keys; use `ties` for equal strength.
+    def __lt__(self, other: "Hand") -> bool:
+        return self.rank < other.rank
+
+    def __gt__(self, other: "Hand") -> bool:
+        return self.rank > other.rank
+
+    def __le__(self, other: "Hand") -> bool:
+        return self.rank <= other.rank
+
+    def __ge__(self, other: "Hand") -> bool:
+        return self.rank >= other.rank
+
+    def ties(self, other: "Hand") -> bool:
+        return self.rank == other.rank
+
+    @classmethod
+    def from_class(
+        cls, cards: Iterable[Card | int], hand_class: "HandClass"
+    ) -> "Hand":
+        """An unsaved hand of these five cards, ranked by `hand_class`."""
+        registry = card_registry()
+        codes = sorted(
+            card.code if isinstance(card, Card) else int(card) for card in cards
+        )
+        card1, card2, card3, card4, card5 = (
+            registry.by_code[code].id for code in codes
+        )
+        return cls(
+            card1_id=card1,
+            card2_id=card2,
+            card3_id=card3,
+            card4_id=card4,
+            card5_id=card5,
+            hand_type=hand_class.hand_type,
+            rank=hand_class.rank,
+            card_mask=card_mask(codes),
+        )
+
+    @staticmethod
+    def showdown(hands: Sequence["Hand"]) -> list[int]:
+        """Indexes of the winning hands; more than one means a split pot.
+        No hands have no winners."""
+        if not hands:
+            return []
+        best = max(hand.rank for hand in hands)
+        return [i for i, hand in enumerate(hands) if hand.rank == best]
+
+    @property
+    def strength_class(self) -> "StrengthClass":
+        from .evaluator import strength_class
+
+        return strength_class(self.rank)
+
+    def save(self, *args, **kwargs):
+        self.card_mask = card_mask(self.cards)
+        super().save(*args, **kwargs)
+
     @property
     def cards(self) -> list[Card]:
         return [self.card5, self.card4, self.card3, self.card2, self.card1]
@@ -117,6 +337,12 @@ class Hand(models.Model):
         return [card.suit for card in self.cards]
 
     def _get_comparison_array(self) -> list[Card.Rank]:
+        return self.comparison_array
+
+    @cached_property
+    def comparison_array(self) -> list[Card.Rank]:
+        """Ranks to break ties within a hand type, computed once per
+        instance."""
         match self.hand_type:
             case self.HandType.STRAIGHT_FLUSH:
                 if Card.Rank.ACE in self.ranks and Card.Rank.FIVE in self.ranks:
@@ -129,7 +355,7 @@ class Hand(models.Model):
                 counts = {v: k for (k, v) in Counter(self.ranks).items()}
                 return [counts[3], counts[2]]
             case self.HandType.FLUSH:
-                return sorted(self.cards, reverse=True)
+                return sorted(self.ranks, reverse=True)
             case self.HandType.STRAIGHT:
                 if Card.Rank.ACE in self.ranks and Card.Rank.FIVE in self.ranks:
                     return [Card.Rank.FIVE]
@@ -159,3 +385,172 @@ class Hand(models.Model):
                 return pair + sorted(kickers, reverse=True)
             case self.HandType.HIGH_CARD:
                 return sorted(self.ranks, reverse=True)
+
+
+class PackedHand(models.Model):
+    """A hand stored as a single integer key instead of five foreign keys:
+    its card codes in ascending order, 6 bits each, lowest code first.
+    `hand_type` is derived from `rank` and cards come from the registry."""
+
+    # a plain "integer" primary key is an alias of the SQLite rowid, so the
+    # key needs no index of its own
+    key = models.IntegerField(primary_key=True)
+
+    rank = models.PositiveIntegerField(db_index=True)
+
+    def __str__(self) -> str:
+        cards = " ".join(str(card) for card in reversed(self.cards))
+        return (
+            f"{self.HandType(self.hand_type).name} (rank: {self.rank}): {cards}"
+        )
+
+    HandType = Hand.HandType
+
+    @staticmethod
+    def pack(cards: Iterable[Card | int]) -> int:
+        key = 0
+        codes = sorted(
+            card.code if isinstance(card, Card) else int(card) for card in cards
+        )
+        for code in reversed(codes):
+            key = key << 6 | code
+        return key
+
+    @classmethod
+    def from_hand(cls, hand: Hand) -> "PackedHand":
+        return cls(key=cls.pack(hand.cards), rank=hand.rank)
+
+    @property
+    def codes(self) -> list[int]:
+        return [self.key >> shift & 63 for shift in range(0, 30, 6)]
+
+    @property
+    def cards(self) -> list[Card]:
+        registry = card_registry()
+        return [registry.by_code[code] for code in self.codes]
+
+    @property
+    def ranks(self) -> list[Card.Rank]:
+        return [card.rank for card in self.cards]
+
+    @property
+    def suits(self) -> list[Card.Suit]:
+        return [card.suit for card in self.cards]
+
+    @property
+    def hand_type(self) -> Hand.HandType:
+        from .evaluator import hand_type
+
+        return hand_type(self.rank)
+
+    @property
+    def strength_class(self) -> "StrengthClass":
+        from .evaluator import strength_class
+
+        return strength_class(self.rank)
+
+
+class HandClassQuerySet(models.QuerySet):
+
+    def lookup(self, cards: Iterable[Card | int]) -> "HandClass":
+        """The class of the hand made of these five cards."""
+        return self.get(key=HandClass.key_of(cards))
+
+    def lookup_many(
+        self,
+        card_sets: Iterable[Iterable[Card | int]],
+        batch_size: int = HandQuerySet.LOOKUP_BATCH_SIZE,
+    ) -> list["HandClass"]:
+        """The class of each card set's hand, in order."""
+        keys = [HandClass.key_of(cards) for cards in card_sets]
+        unique_keys = list(dict.fromkeys(keys))
+        hand_classes = {}
+        for start in range(0, len(unique_keys), batch_size):
+            batch = unique_keys[start : start + batch_size]
+            hand_classes.update(self.in_bulk(batch))
+        missing = len(unique_keys) - len(hand_classes)
+        if missing:
+            raise self.model.DoesNotExist(f"{missing} hands were not found")
+        return [hand_classes[key] for key in keys]
+
+
+class HandClass(models.Model):
+    """One row per strength class instead of one per hand: every hand with
+    the same multiset of card ranks, and either all or not all of one suit,
+    has the same rank. The 7,462 rows stand in for the 2,598,960 `Hand`
+    rows when looking hands up; see `HandQuerySet.lookup`."""
+
+    objects = HandClassQuerySet.as_manager()
+
+    # `evaluator.rank_key` of the five card ranks, shifted left one bit
+    # with the low bit set for a flush; a rowid alias like `PackedHand.key`
+    key = models.IntegerField(primary_key=True)
+
+    rank = models.PositiveIntegerField(unique=True)
+
+    # how many hands share the class
+    combos = models.PositiveIntegerField()
+
+    def __str__(self) -> str:
+        return f"{self.HandType(self.hand_type).name} (rank: {self.rank})"
+
+    HandType = Hand.HandType
+
+    @staticmethod
+    def key_of(cards: Iterable[Card | int]) -> int:
+        """The key of the class of five cards, in any order. Suits only
+        matter through whether the cards make a flush."""
+        from .evaluator import rank_key
+
+        codes = [
+            card.code if isinstance(card, Card) else int(card) for card in cards
+        ]
+        if len(set(codes)) != 5:
+            raise ValueError("A hand is made of five different cards")
+        flush = len({code & 3 for code in codes}) == 1
+        return rank_key([code >> 2 for code in codes]) << 1 | flush
+
+    @classmethod
+    def from_strength(cls, strength: "StrengthClass") -> "HandClass":
+        from .evaluator import rank_key
+
+        return cls(
+            key=rank_key(strength.ranks) << 1 | strength.flush,
+            rank=strength.rank,
+            combos=strength.combos,
+        )
+
+    @property
+    def hand_type(self) -> Hand.HandType:
+        from .evaluator import hand_type
+
+        return hand_type(self.rank)
+
+    @property
+    def strength_class(self) -> "StrengthClass":
+        from .evaluator import strength_class
+
+        return strength_class(self.rank)
+
+
+class GenerationCheckpoint(models.Model):
+    """Progress through one `RankedHandsGenerator.work_units` unit: how many
+    of its `size` hands are committed to the Hand table, and the rank the
+    generator had reached when the last batch was."""
+
+    start_rank = models.PositiveIntegerField(unique=True)
+    method = models.CharField(max_length=32)
+    outer = models.IntegerField(choices=Card.Rank, null=True)
+    size = models.PositiveIntegerField()
+    rows = models.PositiveIntegerField(default=0)
+    current_rank = models.PositiveIntegerField()
+
+    def __str__(self) -> str:
+        label = self.method
+        if self.outer is not None:
+            label = f"{label}({Card.Rank(self.outer).name})"
+        return f"{label}: {self.rows}/{self.size} rows"
+
+    @property
+    def complete(self) -> bool:
+        return self.rows == self.size
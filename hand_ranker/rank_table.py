@@ -0,0 +1,114 @@
+"""Memory-mappable table of every 5-card hand's `Hand.rank`.
+
+Hands are indexed by the combinatorial number system: the sorted card codes
+c1 < c2 < ... < c5 map to ``C(c1, 1) + C(c2, 2) + ... + C(c5, 5)``, a
+perfect hash onto range(2_598_960). The file is a fixed header followed by
+one native uint32 rank per index, so a `RankTable` is a zero-copy view of
+the mapped file and lookups never touch the database.
+"""
+
+import hashlib
+import mmap
+import struct
+from array import array
+from collections.abc import Sequence
+from math import comb
+from pathlib import Path
+
+from django.conf import settings
+
+from .models import Hand
+from .models import card_registry
+
+HAND_COUNT = comb(52, 5)
+
+MAGIC = b"HRNK"
+VERSION = 1
+# magic, version, byte order marker, hand count, sha256 of the ranks
+HEADER = struct.Struct("=4sIII32s")
+HEADER_SIZE = 64
+BYTE_ORDER_MARK = 0x01020304
+
+_CHOOSE = tuple(tuple(comb(n, k) for n in range(52)) for k in range(6))
+
+
+def default_path() -> Path:
+    return Path(settings.HAND_RANK_TABLE)
+
+
+def index(cards: Sequence[int]) -> int:
+    c1, c2, c3, c4, c5 = sorted(cards)
+    return (
+        c1 + _CHOOSE[2][c2] + _CHOOSE[3][c3] + _CHOOSE[4][c4] + _CHOOSE[5][c5]
+    )
+
+
+def ranks_from_database(chunk_size: int = 10_000) -> array:
+    codes = {card.id: card.code for card in card_registry().cards}
+    ranks = array("I", bytes(4 * HAND_COUNT))
+    rows = Hand.objects.values_list(
+        "card1_id", "card2_id", "card3_id", "card4_id", "card5_id", "rank"
+    )
+    count = 0
+    for *card_ids, rank in rows.iterator(chunk_size=chunk_size):
+        ranks[index([codes[card_id] for card_id in card_ids])] = rank
+        count += 1
+    if count != HAND_COUNT or 0 in ranks:
+        raise ValueError(
+            f"Hand table holds {count} hands, expected {HAND_COUNT}"
+        )
+    return ranks
+
+
+def checksum(ranks: array | memoryview) -> bytes:
+    return hashlib.sha256(ranks).digest()
+
+
+def write(ranks: array, path: Path | None = None) -> Path:
+    path = path or default_path()
+    header = HEADER.pack(
+        MAGIC, VERSION, BYTE_ORDER_MARK, len(ranks), checksum(ranks)
+    )
+    with open(path, "wb") as f:
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        ranks.tofile(f)
+    return path
+
+
+def build(path: Path | None = None) -> Path:
+    return write(ranks_from_database(), path)
+
+
+class RankTable:
+
+    def __init__(self, path: Path | None = None):
+        self.path = path or default_path()
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, byte_order, count, digest = HEADER.unpack_from(
+            self._mmap
+        )
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.path} is not a version {VERSION} table")
+        if byte_order != BYTE_ORDER_MARK:
+            raise ValueError(f"{self.path} was built with another byte order")
+        if count != HAND_COUNT:
+            raise ValueError(f"{self.path} holds {count} hands")
+        if len(self._mmap) != HEADER_SIZE + 4 * count:
+            raise ValueError(f"{self.path} is not {count} hands long")
+        self.checksum = digest
+        self.ranks = memoryview(self._mmap)[HEADER_SIZE:].cast("I")
+
+    def rank(self, cards: Sequence[int]) -> int:
+        return self.ranks[index(cards)]
+
+    def verify(self) -> bool:
+        """Check the mapped ranks against the checksum in the header."""
+        return checksum(self.ranks) == self.checksum
+
+    def verify_against_database(self) -> bool:
+        return checksum(ranks_from_database()) == self.checksum
+
+    def close(self):
+        self.ranks.release()
+        self._mmap.close()
@@ -1,3 +1,1382 @@
+import functools
+import importlib
+import io
+import itertools
+import json
+import logging
+import math
+import random
+import tempfile
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.http import HttpResponse
+from django.test import RequestFactory
 from django.test import TestCase
+from django.test import TransactionTestCase
+from django.test import override_settings
+from django.urls import resolve
+from django.urls import reverse
+
+import equity
+from gameplay import Deck
+from gameplay import deal_many
+
+from . import batch
+from . import cache
+from . import evaluator
+from . import metrics
+from . import rank_table
+from .cards import encode
+from .cards import parse_cards
+from .cards import to_str
+from .generate import CardGenerator
+from .generate import RankedHandsGenerator
+from .instrumentation import Instrumentation
+from .models import GenerationCheckpoint
+from .models import Hand
+from .models import HandClass
+from .models import PackedHand
+from .models import card_mask
+from .models import card_registry
+from .models import reset_card_registry
+
+
+@functools.cache
+def evaluator_ranks() -> array:
+    """Every hand's rank from `evaluator.evaluate`, in rank table order."""
+    ranks = array("I", bytes(4 * rank_table.HAND_COUNT))
+    for cards in itertools.combinations(range(52), 5):
+        ranks[rank_table.index(cards)] = evaluator.evaluate(cards)
+    return ranks
+
+
+def write_evaluator_table(path: Path) -> Path:
+    """A rank table built without the database."""
+    return rank_table.write(evaluator_ranks(), path)
+
+
+def generate_unit(method, outer, start_rank) -> list[Hand]:
+    generator = RankedHandsGenerator()
+    generator.current_rank = start_rank
+    generate = getattr(generator, method)
+    return list(generate() if outer is None else generate(outer))
+
+
+def codes(hand: Hand) -> list[int]:
+    return [encode(card.rank, card.suit) for card in hand.cards]
+
+
+class EvaluatorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        CardGenerator().create_deck()
+
+    def test_matches_generated_ranks(self):
+        # every unsliced category plus the smallest slice of each sliced one
+        units = {}
+        for method, outer, start_rank in RankedHandsGenerator.work_units():
+            units[method] = (method, outer, start_rank)
+            if outer is None:
+                self.check_unit(method, outer, start_rank)
+        for unit in units.values():
+            if unit[1] is not None:
+                self.check_unit(*unit)
+
+    def check_unit(self, method, outer, start_rank):
+        for hand in generate_unit(method, outer, start_rank):
+            self.assertEqual(
+                evaluator.evaluate_with_type(codes(hand)),
+                (hand.rank, hand.hand_type),
+                str(hand),
+            )
+
+    def test_card_order_does_not_matter(self):
+        hand = parse_cards("Ah 2h 3h 4h 5h")
+        self.assertEqual(
+            evaluator.evaluate(hand), evaluator.evaluate(hand[::-1])
+        )
+        self.assertEqual(
+            evaluator.hand_type(evaluator.evaluate(hand)),
+            Hand.HandType.STRAIGHT_FLUSH,
+        )
+
+    def test_hand_type_rejects_invalid_ranks(self):
+        lowest = evaluator.strength_classes()[-1].rank
+        self.assertEqual(evaluator.hand_type(lowest), Hand.HandType.HIGH_CARD)
+        for rank in (0, 5, lowest - 1, evaluator.MAX_RANK + 1):
+            with self.assertRaises(ValueError):
+                evaluator.hand_type(rank)
+
+    def test_best_of_seven_matches_all_subsets(self):
+        rng = random.Random(0)
+        for _ in range(2_000):
+            cards = rng.sample(range(52), 7)
+            self.assertEqual(
+                evaluator.evaluate_best(cards),
+                max(map(evaluator.evaluate, itertools.combinations(cards, 5))),
+            )
+
+    def test_strength_classes(self):
+        classes = evaluator.strength_classes()
+        self.assertEqual(len(classes), 7462)
+        self.assertEqual(
+            sum(strength.combos for strength in classes),
+            RankedHandsGenerator.MAX_RANK,
+        )
+        self.assertEqual(classes[-1].rank, classes[-1].combos)
+
+    def test_strength_class_lookups(self):
+        # the best full house: aces full of kings
+        rank = evaluator.evaluate(parse_cards("As Ah Ad Ks Kh"))
+        strength = evaluator.strength_class(rank)
+        self.assertEqual(strength.hand_type, Hand.HandType.FULL_HOUSE)
+        self.assertEqual(strength.pattern, (12, 11))
+        self.assertEqual(strength.combos, 24)
+        self.assertEqual(evaluator.hands_beating(rank), 40 + 624)
+        self.assertEqual(
+            evaluator.hands_beaten(rank),
+            RankedHandsGenerator.MAX_RANK - 40 - 624 - 24,
+        )
+        royal = evaluator.evaluate(parse_cards("As Ks Qs Js Ts"))
+        self.assertEqual(evaluator.hands_beating(royal), 0)
+        self.assertEqual(evaluator.percentile(royal), 100)
+        with self.assertRaises(ValueError):
+            evaluator.strength_class(rank - 1)
+
+
+class ExactEquityTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        CardGenerator().create_deck()
+
+    def test_suit_reduction_matches_brute_force(self):
+        rng = random.Random(0)
+        for players, board_size in itertools.product((2, 3), (3, 4)):
+            cards = rng.sample(range(52), 2 * players + board_size)
+            hands = [cards[i : i + 2] for i in range(0, 2 * players, 2)]
+            board = cards[2 * players :]
+            reduced = equity.exact_equity(hands, board)
+            brute_force = equity.exact_equity(hands, board, reduce_suits=False)
+            for fast, slow in zip(reduced.players, brute_force.players):
+                self.assertEqual(
+                    (fast.rollouts, fast.wins, fast.ties),
+                    (slow.rollouts, slow.wins, slow.ties),
+                )
+                self.assertAlmostEqual(fast.shares, slow.shares)
+
+    def test_known_spot(self):
+        result = equity.exact_equity(
+            [parse_cards("Ah Kh"), parse_cards("Qs Qd")],
+            parse_cards("2h 7h Qc"),
+        )
+        self.assertEqual(result.rollouts, 990)
+        self.assertAlmostEqual(result.players[0].equity, 253 / 990)
+        self.assertEqual(result.players[0].stderr, 0)
+
+    def test_rejects_too_few_live_cards(self):
+        # 24 players hold 48 cards, leaving 4 for a 5-card board
+        hands = [[card, card + 1] for card in range(0, 48, 2)]
+        with self.assertRaises(ValueError):
+            equity.live_cards(hands, [])
+        with self.assertRaises(ValueError):
+            equity.exact_equity(hands, [])
+        self.assertEqual(len(equity.live_cards(hands[:-1], [])), 6)
+
+
+class ResumableGenerationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        CardGenerator().create_deck()
+
+    def test_resumes_after_interruption(self):
+        # straight flushes, quads and full houses
+        units = RankedHandsGenerator.work_units()[:3]
+        bulk_create = Hand.objects.bulk_create
+        calls = 0
+
+        def fail_on_second_full_house_batch(batch):
+            nonlocal calls
+            calls += 1
+            if calls == 4:
+                raise DatabaseError("interrupted")
+            return bulk_create(batch)
+
+        with self.assertLogs("hand_ranker", "INFO"):
+            with mock.patch.object(
+                Hand.objects, "bulk_create", fail_on_second_full_house_batch
+            ):
+                with self.assertRaises(DatabaseError):
+                    RankedHandsGenerator().resume_to_db(1000, units)
+            self.assertEqual(Hand.objects.count(), 40 + 624 + 1000)
+            written = RankedHandsGenerator().resume_to_db(1000, units)
+
+        self.assertEqual(written, 3744 - 1000)
+        self.assertTrue(
+            all(c.complete for c in GenerationCheckpoint.objects.all())
+        )
+        expected = [
+            (hand.card_mask, hand.rank)
+            for unit in units
+            for hand in generate_unit(*unit)
+        ]
+        self.assertEqual(
+            sorted(Hand.objects.values_list("card_mask", "rank")),
+            sorted(expected),
+        )
+        self.assertEqual(
+            RankedHandsGenerator.verify_rank_coverage(),
+            [f"ranks {units[-1][2] - 3744} to 1 are missing"],
+        )
+
+
+class EvaluateViewTests(TestCase):
+
+    def post(self, body):
+        return self.client.post(
+            reverse("hand_ranker:evaluate"),
+            body,
+            content_type="application/json",
+        )
+
+    def test_evaluates_batch(self):
+        response = self.post(
+            {
+                "hands": [
+                    "As Ks Qs Js Ts",
+                    "2c 2d 7h 9s Kd Qc 3h",
+                    "Ah Kh Qh Jh Th",
+                ]
+            }
+        )
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual(
+            [(r["hand_type"], r["winner"]) for r in results],
+            [
+                ("Straight Flush", True),
+                ("Pair", False),
+                ("Straight Flush", True),
+            ],
+        )
+        self.assertEqual(
+            results[1]["rank"],
+            evaluator.evaluate_best(parse_cards("2c 2d 7h 9s Kd Qc 3h")),
+        )
+
+    def test_tables_built_at_startup(self):
+        import poker.wsgi
+
+        evaluator._best_tables.cache_clear()
+        importlib.reload(poker.wsgi)
+        self.assertEqual(evaluator._best_tables.cache_info().currsize, 1)
+
+    def test_rejects_invalid_hands(self):
+        for body in (
+            "not json",
+            {"hands": []},
+            {"hands": ["As Ks Qs Js"]},
+            {"hands": ["As As Qs Js Ts"]},
+            {"hands": ["As Ks Qs Js 1s"]},
+        ):
+            response = self.post(body)
+            self.assertEqual(response.status_code, 400, body)
+            self.assertIn("error", response.json())
+
+
+class InstrumentationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        CardGenerator().create_deck()
+
+    def test_measures_batches(self):
+        measurements = []
+        instrumentation = Instrumentation(
+            callbacks=[measurements.append], profile=True, trace_memory=True
+        )
+        generator = RankedHandsGenerator(instrumentation=instrumentation)
+        generator.records = generate_unit(*RankedHandsGenerator.work_units()[1])
+        with self.assertLogs("hand_ranker", "DEBUG") as logs:
+            generator.bulk_write_hands_to_db(batch_size=100)
+        self.assertEqual(len(measurements), 7)
+        self.assertEqual(len(logs.records), 7)
+        self.assertEqual(sum(m.objects for m in measurements), 624)
+        for measurement in measurements:
+            self.assertEqual(measurement.kind, "batch")
+            self.assertGreater(measurement.traced_peak_bytes, 0)
+            self.assertGreaterEqual(measurement.wall_seconds, 0)
+        self.assertIn("bulk_create", instrumentation.profile_stats())
+
+    def test_nested_sections(self):
+        instrumentation = Instrumentation(trace_memory=True)
+        with self.assertLogs("hand_ranker", "INFO"):
+            with instrumentation.measure("outer") as outer:
+                with instrumentation.measure("inner", "batch") as inner:
+                    inner.objects = len(bytearray(2**20))
+                outer.objects = inner.objects
+        self.assertGreaterEqual(outer.traced_peak_bytes, 2**20)
+        self.assertGreaterEqual(
+            outer.traced_peak_bytes, inner.traced_peak_bytes
+        )
+        self.assertEqual(
+            [m.name for m in instrumentation.measurements], ["inner", "outer"]
+        )
+
+
+class AsyncViewTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        CardGenerator().create_deck()
+
+    def setUp(self):
+        cache.equity_cache.clear()
+
+    async def post(self, name, body):
+        return await self.async_client.post(
+            reverse(f"hand_ranker:{name}"),
+            body,
+            content_type="application/json",
+        )
+
+    async def test_evaluate_async(self):
+        response = await self.post(
+            "evaluate_async", {"hands": ["As Ks Qs Js Ts", "2c 2d 7h 9s Kd"]}
+        )
+        self.assertEqual(
+            [r["winner"] for r in response.json()["results"]], [True, False]
+        )
+
+    async def test_streams_monte_carlo_estimates(self):
+        response = await self.post(
+            "equity",
+            {
+                "hands": ["Ah Kh", "Qs Qd"],
+                "board": "2h 7h Qc",
+                "target_stderr": 0,
+                "max_rollouts": 10_000,
+                "seed": 0,
+            },
+        )
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = [line async for line in response.streaming_content]
+        results = [json.loads(line) for line in lines]
+        rollouts = [result["rollouts"] for result in results]
+        self.assertEqual(rollouts, sorted(rollouts))
+        self.assertEqual(rollouts[-1], 10_000)
+        self.assertAlmostEqual(
+            results[-1]["players"][0]["equity"], 253 / 990, delta=0.03
+        )
+
+    async def test_exact_equity(self):
+        response = await self.post(
+            "equity",
+            {"hands": ["Ah Kh", "Qs Qd"], "board": "2h 7h Qc", "exact": True},
+        )
+        lines = [line async for line in response.streaming_content]
+        self.assertEqual(len(lines), 1)
+        result = json.loads(lines[0])
+        self.assertEqual(result["rollouts"], 990)
+        self.assertAlmostEqual(result["players"][0]["equity"], 253 / 990)
+
+        # served from the cache the second time
+        response = await self.post(
+            "equity",
+            {"hands": ["As Ks", "Qh Qd"], "board": "2s 7s Qc", "exact": True},
+        )
+        lines = [line async for line in response.streaming_content]
+        self.assertEqual(json.loads(lines[0]), result)
+        self.assertEqual(cache.equity_cache.stats()["hits"], 1)
+
+    async def test_rejects_duplicate_cards(self):
+        response = await self.post(
+            "equity", {"hands": ["Ah Kh", "Ah Qd"], "board": "2h 7h Qc"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    async def test_rejects_too_few_live_cards(self):
+        hands = [
+            f"{to_str(card)} {to_str(card + 1)}" for card in range(0, 48, 2)
+        ]
+        response = await self.post("equity", {"hands": hands})
+        self.assertEqual(response.status_code, 400)
+
+
+class ResultCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        CardGenerator().create_deck()
+
+    def setUp(self):
+        cache.equity_cache.clear()
+
+    def test_canonical_key_ignores_suit_labels(self):
+        self.assertEqual(
+            cache.canonical_key(parse_cards("Ah Kh"), parse_cards("Qs Qd")),
+            cache.canonical_key(parse_cards("Ks As"), parse_cards("Qh Qc")),
+        )
+        self.assertNotEqual(
+            cache.canonical_key(parse_cards("Ah Kh"), parse_cards("Qs Qd")),
+            cache.canonical_key(parse_cards("Ah Kd"), parse_cards("Qs Qh")),
+        )
+
+    def test_lru_eviction(self):
+        lru = cache.ResultCache("test", maxsize=2)
+        lru.set("a", 1)
+        lru.set("b", 2)
+        lru.get("a")
+        lru.set("c", 3)
+        self.assertIsNone(lru.get("b"))
+        self.assertEqual(lru.get("a"), 1)
+        self.assertEqual(
+            {
+                k: lru.stats()[k]
+                for k in ("size", "hits", "misses", "evictions")
+            },
+            {"size": 2, "hits": 2, "misses": 1, "evictions": 1},
+        )
+
+    def test_equity_shared_across_suit_relabelling(self):
+        first = cache.equity_result(
+            [parse_cards("Ah Kh"), parse_cards("Qs Qd")],
+            parse_cards("2h 7h Qc"),
+            exact=True,
+        )
+        second = cache.equity_result(
+            [parse_cards("As Ks"), parse_cards("Qh Qc")],
+            parse_cards("2s 7s Qd"),
+            exact=True,
+        )
+        self.assertIs(first, second)
+        self.assertEqual(cache.equity_cache.stats()["hits"], 1)
+
+    @override_settings(
+        HAND_RANKER_CACHE_BACKEND="default",
+        CACHES={
+            "default": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache"
+            }
+        },
+    )
+    def test_shared_backend(self):
+        key = cache.equity_key([[0, 1], [2, 3]], [], False, {})
+        cache.equity_cache.set(key, "result")
+        cache.equity_cache.clear()
+        self.assertEqual(cache.equity_cache.get(key), "result")
+        self.assertEqual(cache.equity_cache.stats()["shared_hits"], 1)
+
+
+class MetricsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        CardGenerator().create_deck()
+
+    def setUp(self):
+        metrics.registry.clear()
+        cache.equity_cache.clear()
+
+    def test_counts_queries(self):
+        def view(request):
+            Hand.objects.count()
+            Hand.objects.exists()
+            return HttpResponse()
+
+        request = RequestFactory().get("/hands/evaluate/")
+        request.resolver_match = resolve("/hands/evaluate/")
+        Hand.objects.count()
+        metrics.MetricsMiddleware(view)(request)
+        stats = metrics.registry.snapshot()["hand_ranker:evaluate"]
+        self.assertEqual((stats.requests, stats.queries), (1, 2))
+        self.assertGreater(stats.db_seconds, 0)
+        self.assertGreaterEqual(stats.seconds, stats.db_seconds)
+        self.assertEqual(sum(stats.latency_counts), 1)
+
+    async def test_streamed_cache_lookups(self):
+        for hands, board in (("Ah Kh", "Qs Qd"), "2h 7h Qc"), (
+            ("As Ks", "Qh Qd"),
+            "2s 7s Qc",
+        ):
+            response = await self.async_client.post(
+                reverse("hand_ranker:equity"),
+                {"hands": hands, "board": board, "exact": True},
+                content_type="application/json",
+            )
+            [line async for line in response.streaming_content]
+        stats = metrics.registry.snapshot()["hand_ranker:equity"]
+        self.assertEqual(stats.requests, 2)
+        self.assertEqual((stats.cache_hits, stats.cache_misses), (1, 1))
+        self.assertEqual(stats.cache_hit_rate, 0.5)
+
+    def test_metrics_endpoint(self):
+        self.client.post(
+            reverse("hand_ranker:evaluate"),
+            {"hands": ["As Ks Qs Js Ts"]},
+            content_type="application/json",
+        )
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        self.assertIn(
+            'hand_ranker_requests_total{endpoint="hand_ranker:evaluate"} 1',
+            text,
+        )
+        self.assertIn(
+            'hand_ranker_request_seconds_bucket{endpoint="hand_ranker:evaluate"'
+            ',le="+Inf"} 1',
+            text,
+        )
+        self.assertIn('hand_ranker_cache_size{cache="equity"} 0', text)
+        self.assertNotIn('cache="rank"', text)
+
+        response = self.client.get(reverse("metrics"), REMOTE_ADDR="10.0.0.1")
+        self.assertEqual(response.status_code, 403)
+
+
+class HandClassTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        CardGenerator().create_deck()
+        HandClass.objects.bulk_create(
+            map(HandClass.from_strength, evaluator.strength_classes())
+        )
+
+    def test_one_row_per_class(self):
+        self.assertEqual(HandClass.objects.count(), 7462)
+        self.assertEqual(
+            sum(HandClass.objects.values_list("combos", flat=True)),
+            evaluator.MAX_RANK,
+        )
+
+    @override_settings(HAND_RANKER_HAND_STORE="classes")
+    def test_lookup_from_classes(self):
+        rng = random.Random(0)
+        card_sets = [rng.sample(range(52), 5) for _ in range(500)]
+        card_sets.append(parse_cards("Ah 2h 3h 4h 5h"))
+        card_registry()
+        with self.assertNumQueries(1):
+            hands = Hand.objects.lookup_many(card_sets)
+        for cards, hand in zip(card_sets, hands):
+            rank = evaluator.evaluate(cards)
+            self.assertEqual(hand.rank, rank)
+            self.assertEqual(hand.hand_type, evaluator.hand_type(rank))
+            self.assertEqual(card_mask(hand.cards), card_mask(cards))
+        hand = Hand.objects.lookup(parse_cards("Kd Ks Kc 9h 9d"))
+        self.assertEqual(hand.comparison_array, [13, 9])
+        self.assertEqual(hand.hand_type, Hand.HandType.FULL_HOUSE)
+
+        # filtered querysets still read the (here empty) Hand table
+        with self.assertRaises(Hand.DoesNotExist):
+            Hand.objects.filter(rank__gt=0).lookup(card_sets[0])
+        with self.assertRaises(ValueError):
+            Hand.objects.lookup(parse_cards("Ah Ah 3h 4h 5h"))
+
+
+class OracleTests(TestCase):
+    """Invariants of the full ranking, checked against every hand the
+    generator produces and against plain combinatorics rather than the
+    generator's own bookkeeping."""
+
+    @classmethod
+    def setUpTestData(cls):
+        CardGenerator().create_deck()
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # kept outside setUpTestData, which would deep-copy them per test
+        masks, ranks, types = [], [], []
+        cls.misordered = []
+        cls.representatives = {}
+        generator = RankedHandsGenerator(
+            instrumentation=Instrumentation(level=logging.DEBUG)
+        )
+        for hand in generator.iter_all_hands():
+            masks.append(hand.card_mask)
+            ranks.append(hand.rank)
+            types.append(hand.hand_type)
+            cls.representatives.setdefault(hand.rank, hand)
+            slot_ranks = [card.rank for card in reversed(hand.cards)]
+            if slot_ranks != sorted(slot_ranks):
+                cls.misordered.append(hand)
+        cls.masks = np.array(masks, dtype=np.uint64)
+        cls.ranks = np.array(ranks)
+        cls.types = np.array(types)
+        # number of cards of each rank in each hand, from the card masks
+        nibbles = np.array([bin(i).count("1") for i in range(16)])
+        cls.rank_counts = np.stack(
+            [
+                nibbles[(cls.masks >> np.uint64(4 * r)) & np.uint64(15)]
+                for r in range(13)
+            ],
+            axis=1,
+        )
+        suit_mask = sum(1 << 4 * r for r in range(13))
+        cls.flush = np.zeros(len(cls.masks), dtype=bool)
+        for suit in range(4):
+            suited = cls.masks & np.uint64(suit_mask << suit)
+            cls.flush |= np.bitwise_count(suited) == 5
+
+    def test_unique_hands(self):
+        self.assertEqual(len(self.masks), math.comb(52, 5))
+        self.assertEqual(len(np.unique(self.masks)), math.comb(52, 5))
+        self.assertTrue((np.bitwise_count(self.masks) == 5).all())
+
+    def test_category_counts(self):
+        no_straight = math.comb(13, 5) - 10
+        off_suit = 4**5 - 4
+        expected = {
+            Hand.HandType.STRAIGHT_FLUSH: 10 * 4,
+            Hand.HandType.QUADS: 13 * 12 * 4,
+            Hand.HandType.FULL_HOUSE: 13 * 4 * 12 * 6,
+            Hand.HandType.FLUSH: no_straight * 4,
+            Hand.HandType.STRAIGHT: 10 * off_suit,
+            Hand.HandType.TRIPS: 13 * 4 * math.comb(12, 2) * 4**2,
+            Hand.HandType.TWO_PAIR: math.comb(13, 2) * 6**2 * 11 * 4,
+            Hand.HandType.PAIR: 13 * 6 * math.comb(12, 3) * 4**3,
+            Hand.HandType.HIGH_CARD: no_straight * off_suit,
+        }
+        self.assertEqual(Counter(self.types.tolist()), expected)
+
+    def test_hand_types_match_cards(self):
+        counts = self.rank_counts
+        present = (counts > 0) @ (1 << np.arange(13))
+        straights = [0b11111 << low for low in range(9)] + [0b1000000001111]
+        straight = np.isin(present, straights)
+        most = counts.max(axis=1)
+        pairs = (counts == 2).sum(axis=1)
+        expected = np.select(
+            [
+                straight & self.flush,
+                most == 4,
+                (most == 3) & (pairs == 1),
+                self.flush,
+                straight,
+                most == 3,
+                pairs == 2,
+                pairs == 1,
+            ],
+            [9, 8, 7, 6, 5, 4, 3, 2],
+            default=1,
+        )
+        self.assertTrue((expected == self.types).all())
+
+    def test_ranks_contiguous(self):
+        values, counts = np.unique(self.ranks, return_counts=True)
+        # each rank counts the hands at most as strong, ties included
+        self.assertTrue((values == np.cumsum(counts)).all())
+        self.assertEqual(values[-1], RankedHandsGenerator.MAX_RANK)
+
+    def test_order_matches_comparison_array(self):
+        strengths = [
+            (hand.hand_type, hand._get_comparison_array())
+            for _, hand in sorted(self.representatives.items(), reverse=True)
+        ]
+        for stronger, weaker in zip(strengths, strengths[1:]):
+            self.assertGreater(stronger, weaker)
+
+    def test_equal_strength_shares_rank(self):
+        # hands are equally strong exactly when they have the same ranks
+        # and both or neither are flushes, whatever their suits
+        strength = self.rank_counts @ (5 ** np.arange(13)) * 2 + self.flush
+        classes = np.unique(strength)
+        self.assertEqual(len(classes), 7462)
+        self.assertEqual(
+            len(np.unique(np.stack([strength, self.ranks]), axis=1)[0]), 7462
+        )
+
+    def test_cards_in_ascending_rank_order(self):
+        self.assertEqual(self.misordered[:5], [])
+
+
+class DealTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        CardGenerator().create_deck()
+
+    def test_deal(self):
+        deck = Deck(random.Random(0))
+        hole = deck.deal(2)
+        board = deck.deal(5)
+        self.assertEqual(len(deck.cards), 45)
+        self.assertEqual(len(set(hole + board + deck.cards)), 52)
+        self.assertEqual(deck.deal(0), [])
+        self.assertEqual(len(deck.cards), 45)
+        self.assertEqual(len(deck.deal(45)), 45)
+        self.assertEqual(deck.cards, [])
+        for n in (1, -1):
+            with self.assertRaises(ValueError):
+                deck.deal(n)
+        deck.new_game()
+        self.assertEqual(sorted(deck.cards), list(range(52)))
+
+    def test_deal_many(self):
+        dealt = deal_many(1000, 9, np.random.default_rng(0))
+        self.assertEqual(dealt.shape, (1000, 9))
+        self.assertTrue(((dealt >= 0) & (dealt < 52)).all())
+        self.assertTrue(all(len(set(row)) == 9 for row in dealt.tolist()))
+        self.assertEqual(deal_many(3, 0).shape, (3, 0))
+        for n in (53, -1):
+            with self.assertRaises(ValueError):
+                deal_many(1, n)
+
+
+class BatchTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        directory = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(directory.cleanup)
+        cls.table = rank_table.RankTable(
+            write_evaluator_table(Path(directory.name) / "ranks.bin")
+        )
+        cls.addClassCleanup(cls.table.close)
+        rng = random.Random(0)
+        cls.fives = [rng.sample(range(52), 5) for _ in range(2000)]
+        cls.sevens = [rng.sample(range(52), 7) for _ in range(2000)]
+
+    def test_matches_evaluator(self):
+        expected = [evaluator.evaluate(cards) for cards in self.fives]
+        for table in (None, self.table):
+            self.assertEqual(
+                batch.evaluate(self.fives, table, chunk_size=300).tolist(),
+                expected,
+            )
+        expected = [evaluator.evaluate_best(cards) for cards in self.sevens]
+        for table in (None, self.table):
+            self.assertEqual(
+                batch.evaluate(self.sevens, table).tolist(), expected
+            )
+
+    def test_hand_types(self):
+        ranks, types = batch.evaluate_with_types(self.fives)
+        self.assertEqual(
+            types.tolist(),
+            [evaluator.hand_type(rank) for rank in ranks.tolist()],
+        )
+        self.assertEqual(
+            batch.hand_types(
+                [evaluator.strength_classes()[-1].rank, evaluator.MAX_RANK]
+            ).tolist(),
+            [Hand.HandType.HIGH_CARD, Hand.HandType.STRAIGHT_FLUSH],
+        )
+        for ranks in ([5], [evaluator.MAX_RANK + 1]):
+            with self.assertRaises(ValueError):
+                batch.hand_types(ranks)
+        self.assertEqual(batch.hand_types([]).tolist(), [])
+
+    def test_rejects_invalid_hands(self):
+        for cards in (
+            [[0, 0, 0, 0, 0]],
+            [[51] * 5],
+            [[0, 1, 2, 3, 52]],
+            [[-1, 1, 2, 3, 4]],
+            [[0, 1, 2, 3, 4, 5, 5]],
+            [[0, 1, 2, 3]],
+            [0, 1, 2, 3, 4],
+        ):
+            with self.assertRaises(ValueError, msg=cards):
+                batch.evaluate(cards)
+
+
+def seed_strongest_hands() -> list[Hand]:
+    """Write the straight flushes, quads and full houses to the Hand table."""
+    hands = [
+        hand
+        for unit in RankedHandsGenerator.work_units()[:3]
+        for hand in generate_unit(*unit)
+    ]
+    return Hand.objects.bulk_create(hands)
+
+
+class HandLookupTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        CardGenerator().create_deck()
+        cls.hands = seed_strongest_hands()
+
+    def setUp(self):
+        card_registry()
+
+    def test_lookup_in_any_order(self):
+        royal = parse_cards("As Ks Qs Js Ts")
+        hand = Hand.objects.lookup(royal)
+        self.assertEqual(hand.rank, evaluator.MAX_RANK)
+        self.assertEqual(Hand.objects.lookup(royal[::-1]), hand)
+        registry = card_registry()
+        mixed = [registry.by_code[royal[0]], *royal[1:3]]
+        mixed += [registry.by_code[royal[3]], royal[4]]
+        self.assertEqual(Hand.objects.lookup(mixed), hand)
+        self.assertEqual(list(Hand.objects.with_cards(royal[::-1])), [hand])
+
+    def test_lookup_errors(self):
+        for cards in ("As Ks Qs Js", "As As Qs Js Ts", "As Ks Qs Js Ts 9s"):
+            with self.assertRaises(ValueError, msg=cards):
+                Hand.objects.lookup(parse_cards(cards))
+        # a high card hand, which is not in the table
+        with self.assertRaises(Hand.DoesNotExist):
+            Hand.objects.lookup(parse_cards("As Kd 9h 5c 3s"))
+        with self.assertRaises(Hand.DoesNotExist):
+            Hand.objects.lookup_many(
+                [codes(self.hands[0]), parse_cards("As Kd 9h 5c 3s")]
+            )
+
+    def test_cards_need_no_queries(self):
+        hands = list(Hand.objects.order_by("id")[::40])
+        with self.assertNumQueries(0):
+            for hand in hands:
+                self.assertEqual(
+                    [card.id for card in hand.cards],
+                    [
+                        hand.card5_id,
+                        hand.card4_id,
+                        hand.card3_id,
+                        hand.card2_id,
+                        hand.card1_id,
+                    ],
+                )
+                str(hand)
+                hand.comparison_array
+
+    def test_lookup_many(self):
+        hands = self.hands[::400]
+        card_sets = [codes(hand)[::-1] for hand in hands]
+        # repeated card sets are resolved once and returned in order
+        card_sets += card_sets[:3]
+        with self.assertNumQueries(3):
+            found = Hand.objects.lookup_many(card_sets, batch_size=4)
+        self.assertEqual(len(hands), 12)
+        self.assertEqual(found, hands + hands[:3])
+        self.assertEqual(
+            [hand.rank for hand in found],
+            [hand.rank for hand in hands + hands[:3]],
+        )
+
+
+def make_hand(cards: str | list[int]) -> Hand:
+    """An unsaved Hand of these cards, ranked by the evaluator."""
+    if isinstance(cards, str):
+        cards = parse_cards(cards)
+    strength = evaluator.strength_class(evaluator.evaluate(cards))
+    return Hand.from_class(cards, HandClass.from_strength(strength))
+
+
+class HandComparisonTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        CardGenerator().create_deck()
+
+    def test_comparisons(self):
+        quads = make_hand("9s 9h 9d 9c 2s")
+        full_house = make_hand("As Ah Ad Ks Kh")
+        same_full_house = make_hand("Ac Ah Ad Kc Kd")
+        self.assertTrue(quads > full_house)
+        self.assertTrue(full_house < quads)
+        self.assertTrue(full_house <= same_full_house)
+        self.assertTrue(full_house >= same_full_house)
+        self.assertTrue(full_house.ties(same_full_house))
+        self.assertFalse(full_house.ties(quads))
+        self.assertEqual(
+            Hand.showdown([full_house, quads, same_full_house]), [1]
+        )
+        self.assertEqual(Hand.showdown([full_house, same_full_house]), [0, 1])
+        self.assertEqual(Hand.showdown([]), [])
+
+    def test_flush_comparison_array_holds_ranks(self):
+        hand = make_hand("Kh 9h 7h 4h 2h")
+        self.assertEqual(hand.hand_type, Hand.HandType.FLUSH)
+        self.assertEqual(hand.comparison_array, [13, 9, 7, 4, 2])
+        self.assertTrue(
+            all(isinstance(rank, int) for rank in hand.comparison_array)
+        )
+
+    def test_vectorized_showdown(self):
+        rng = random.Random(0)
+        games = []
+        for _ in range(300):
+            cards = rng.sample(range(52), 15)
+            games.append([cards[i : i + 5] for i in range(0, 15, 5)])
+        # split pots: the board plays for everyone
+        games.append([parse_cards("As Ks Qs Js Ts")] * 3)
+        mask = batch.showdown(games)
+        self.assertEqual(mask.shape, (301, 3))
+        for game, row in zip(games, mask.tolist()):
+            hands = [make_hand(cards) for cards in game]
+            self.assertEqual(
+                [i for i, won in enumerate(row) if won], Hand.showdown(hands)
+            )
+        self.assertEqual(mask[-1].tolist(), [True, True, True])
+
+        board = parse_cards("2c 7d 9h Js Qs")
+        holes = [
+            parse_cards("As Kh"),
+            parse_cards("Ad Kc"),
+            parse_cards("3c 4c"),
+        ]
+        self.assertEqual(
+            batch.showdown([[hole + board for hole in holes]]).tolist(),
+            [[True, True, False]],
+        )
+        self.assertEqual(
+            batch.winners([[5, 9, 9], [1, 2, 3]]).tolist(),
+            [[False, True, True], [False, False, True]],
+        )
+
+
+class RankTableTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = write_evaluator_table(Path(directory.name) / "ranks.bin")
+
+    def open_table(self) -> rank_table.RankTable:
+        table = rank_table.RankTable(self.path)
+        self.addCleanup(table.close)
+        return table
+
+    def test_index(self):
+        self.assertEqual(rank_table.index([4, 3, 2, 1, 0]), 0)
+        self.assertEqual(
+            rank_table.index(range(47, 52)), rank_table.HAND_COUNT - 1
+        )
+        # a perfect hash: every slot was filled
+        self.assertNotIn(0, evaluator_ranks())
+
+    def test_round_trip(self):
+        table = self.open_table()
+        self.assertTrue(table.verify())
+        rng = random.Random(0)
+        for _ in range(2000):
+            cards = rng.sample(range(52), 5)
+            self.assertEqual(table.rank(cards), evaluator.evaluate(cards))
+
+    def test_rejects_bad_headers(self):
+        with open(self.path, "r+b") as f:
+            f.truncate(rank_table.HEADER_SIZE + 400)
+        with self.assertRaisesRegex(ValueError, "not 2598960 hands long"):
+            self.open_table()
+        with open(self.path, "r+b") as f:
+            f.write(b"XXXX")
+        with self.assertRaises(ValueError):
+            self.open_table()
+        rank_table.write(array("I", [1, 2, 3]), self.path)
+        with self.assertRaisesRegex(ValueError, "holds 3 hands"):
+            self.open_table()
+
+    def test_detects_corrupted_ranks(self):
+        with open(self.path, "r+b") as f:
+            # the high byte of a rank, always 0
+            f.seek(rank_table.HEADER_SIZE + 4 * 1000 + 3)
+            f.write(b"\xff")
+        self.assertFalse(self.open_table().verify())
+
+
+class ParallelGenerationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        CardGenerator().create_deck()
+
+    def test_generates_units_in_order(self):
+        # more units than the two workers' window of four
+        all_units = RankedHandsGenerator.work_units()
+        units = all_units[:6]
+        generator = RankedHandsGenerator()
+        with self.assertLogs("hand_ranker", "INFO") as logs:
+            total = generator.generate_in_parallel(2, 1000, units)
+        expected = [
+            (hand.card_mask, hand.rank, hand.hand_type)
+            for unit in units
+            for hand in generate_unit(*unit)
+        ]
+        self.assertEqual(total, len(expected))
+        self.assertEqual(len(logs.records), len(units))
+        self.assertEqual(
+            list(
+                Hand.objects.order_by("id").values_list(
+                    "card_mask", "rank", "hand_type"
+                )
+            ),
+            expected,
+        )
+        self.assertEqual(generator.current_rank, all_units[6][2])
+
+
+class MonteCarloTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.executor = ProcessPoolExecutor(2, initializer=equity.init_worker)
+        cls.addClassCleanup(cls.executor.shutdown)
+
+    @classmethod
+    def setUpTestData(cls):
+        CardGenerator().create_deck()
+
+    hands = [parse_cards("Ah Kh"), parse_cards("Qs Qd")]
+    board = parse_cards("2h 7h Qc")
+
+    def estimate(self, **options) -> list[equity.EquityResult]:
+        options = {
+            "batch_size": 1000,
+            "target_stderr": 0,
+            "seed": 1,
+            **options,
+        }
+        return list(
+            equity.iter_monte_carlo(
+                self.hands, self.board, self.executor, 2, **options
+            )
+        )
+
+    def test_seeded_runs_repeat(self):
+        first = self.estimate(max_rollouts=3000)[-1]
+        second = self.estimate(max_rollouts=3000)[-1]
+        self.assertEqual(first.players, second.players)
+        self.assertNotEqual(
+            first.players, self.estimate(max_rollouts=3000, seed=2)[-1].players
+        )
+
+    def test_stops_at_max_rollouts(self):
+        results = self.estimate(max_rollouts=2500)
+        self.assertEqual([r.rollouts for r in results], [2000, 2500])
+        self.assertFalse(results[-1].converged)
+        self.assertEqual(
+            equity.monte_carlo_equity(
+                self.hands,
+                self.board,
+                executor=self.executor,
+                max_rollouts=1,
+                seed=1,
+            ).rollouts,
+            1,
+        )
+        for option in ("max_rollouts", "batch_size", "workers"):
+            with self.assertRaises(ValueError):
+                equity.monte_carlo_equity(
+                    self.hands,
+                    self.board,
+                    executor=self.executor,
+                    **{option: 0},
+                )
+
+    def test_waves_sized_to_executor(self):
+        result = equity.monte_carlo_equity(
+            self.hands,
+            self.board,
+            executor=self.executor,
+            batch_size=1000,
+            time_budget=0,
+            seed=1,
+        )
+        self.assertEqual(result.rollouts, 2000)
+
+    def test_stops_at_target_stderr(self):
+        *earlier, result = self.estimate(target_stderr=0.01)
+        self.assertTrue(result.converged)
+        self.assertLessEqual(result.stderr, 0.01)
+        self.assertTrue(all(r.stderr > 0.01 for r in earlier))
+
+    def test_stops_at_time_budget(self):
+        results = self.estimate(time_budget=0)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0].rollouts, 2000)
+
+    def test_confidence_intervals(self):
+        result = self.estimate(max_rollouts=20_000)[-1]
+        player = result.players[0]
+        self.assertAlmostEqual(
+            player.equity, 253 / 990, delta=4 * player.stderr
+        )
+        self.assertAlmostEqual(
+            sum(p.equity for p in result.players), 1, places=9
+        )
+        for p, (low, high) in (
+            (player.win, player.interval(player.win)),
+            (player.tie, player.interval(player.tie)),
+            (player.loss, player.interval(player.loss)),
+        ):
+            self.assertLessEqual(0, low)
+            self.assertLessEqual(low, p)
+            self.assertLessEqual(p, high)
+            self.assertLessEqual(high, 1)
+        low, high = player.as_dict()["equity_interval"]
+        self.assertAlmostEqual(high - low, 2 * equity.Z_95 * player.stderr)
+        # narrower with four times the rollouts
+        smaller = self.estimate(max_rollouts=5000)[-1].players[0]
+        self.assertLess(player.stderr, smaller.stderr * 0.75)
+
+
+def strongest_units() -> list[tuple]:
+    """The straight flush, quads and full house work units."""
+    return RankedHandsGenerator.work_units()[:3]
+
+
+class PackedHandTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        CardGenerator().create_deck()
+
+    def test_pack_round_trip(self):
+        rng = random.Random(0)
+        for _ in range(1000):
+            cards = rng.sample(range(52), 5)
+            packed = PackedHand(key=PackedHand.pack(cards), rank=1)
+            self.assertEqual(packed.codes, sorted(cards))
+            self.assertEqual([card.code for card in packed.cards], packed.codes)
+        registry = card_registry()
+        cards = [registry.by_code[code] for code in (51, 0, 7, 30, 12)]
+        self.assertEqual(
+            PackedHand.pack(cards), PackedHand.pack([51, 0, 7, 30, 12])
+        )
+
+    def test_hand_type_matches_hand(self):
+        for unit in RankedHandsGenerator.work_units()[::10]:
+            for hand in generate_unit(*unit)[::50]:
+                packed = PackedHand.from_hand(hand)
+                self.assertEqual(packed.hand_type, hand.hand_type)
+                self.assertEqual(packed.codes, sorted(codes(hand)))
+
+    def test_stream_packed_hands(self):
+        expected = {
+            PackedHand.pack(codes(hand)): hand.rank
+            for unit in strongest_units()
+            for hand in generate_unit(*unit)
+        }
+        with mock.patch.object(
+            RankedHandsGenerator,
+            "CATEGORIES",
+            RankedHandsGenerator.CATEGORIES[:3],
+        ):
+            with self.assertLogs("hand_ranker", "INFO"):
+                total = RankedHandsGenerator().stream_hands_to_db(
+                    batch_size=1000, packed=True
+                )
+        self.assertEqual(total, len(expected))
+        self.assertEqual(
+            dict(PackedHand.objects.values_list("key", "rank")), expected
+        )
+        self.assertFalse(Hand.objects.exists())
+
+
+class MigrationTests(TransactionTestCase):
+    """Data migrations, run forward from the migration before them."""
+
+    def migrate(self, target: str):
+        executor = MigrationExecutor(connection)
+        executor.migrate([("hand_ranker", target)])
+        return executor.loader.project_state([("hand_ranker", target)]).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes("hand_ranker"))
+        reset_card_registry()
+
+    def seed(self, apps, card_mask: bool):
+        """Write the strongest hands with historical models, returning the
+        current models' hands they came from."""
+        CardGenerator().create_deck()
+        hands = [
+            hand for unit in strongest_units() for hand in generate_unit(*unit)
+        ]
+        fields = ["card1_id", "card2_id", "card3_id", "card4_id", "card5_id"]
+        fields += ["hand_type", "rank"] + ["card_mask"] * card_mask
+        HistoricalHand = apps.get_model("hand_ranker", "Hand")
+        HistoricalHand.objects.bulk_create(
+            HistoricalHand(**{field: getattr(hand, field) for field in fields})
+            for hand in hands
+        )
+        return hands
+
+    def test_0004_fills_card_masks(self):
+        hands = self.seed(
+            self.migrate("0003_alter_hand_hand_type_alter_hand_rank"),
+            card_mask=False,
+        )
+        apps = self.migrate("0004_hand_card_mask")
+        HistoricalHand = apps.get_model("hand_ranker", "Hand")
+        self.assertEqual(
+            sorted(HistoricalHand.objects.values_list("card_mask", flat=True)),
+            sorted(card_mask(hand.cards) for hand in hands),
+        )
+
+    def test_0005_packs_hands(self):
+        hands = self.seed(self.migrate("0004_hand_card_mask"), card_mask=True)
+        apps = self.migrate("0005_packedhand")
+        HistoricalPackedHand = apps.get_model("hand_ranker", "PackedHand")
+        self.assertEqual(
+            dict(HistoricalPackedHand.objects.values_list("key", "rank")),
+            {PackedHand.pack(codes(hand)): hand.rank for hand in hands},
+        )
+
+
+class CardMaskTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        CardGenerator().create_deck()
+        cls.hands = seed_strongest_hands()
+
+    def test_card_mask(self):
+        registry = card_registry()
+        self.assertEqual(card_mask([0, 5, 51]), 1 | 1 << 5 | 1 << 51)
+        self.assertEqual(
+            card_mask([registry.by_code[0], 5, registry.by_code[51]]),
+            card_mask([0, 5, 51]),
+        )
+        self.assertEqual(card_mask([]), 0)
+        for hand in self.hands[::100]:
+            self.assertEqual(hand.card_mask, card_mask(codes(hand)))
+
+    def test_containing(self):
+        registry = card_registry()
+        rng = random.Random(0)
+        # cards from a seeded hand, so some hands match, and random cards
+        card_sets = [
+            rng.sample(codes(rng.choice(self.hands)), size)
+            for size in (1, 2, 2, 3)
+        ]
+        card_sets += [rng.sample(range(52), 2) for _ in range(3)]
+        # and no cards, which every hand holds
+        card_sets.append([])
+        for cards in card_sets:
+            expected = {
+                hand.id for hand in self.hands if set(cards) <= set(codes(hand))
+            }
+            self.assertEqual(
+                set(
+                    Hand.objects.containing(cards).values_list("id", flat=True)
+                ),
+                expected,
+                cards,
+            )
+        card = registry.by_code[card_sets[0][0]]
+        self.assertEqual(
+            set(card.all_hands.values_list("id", flat=True)),
+            {hand.id for hand in self.hands if card.code in codes(hand)},
+        )
+
+
+class StreamingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        CardGenerator().create_deck()
+
+    def test_streams_in_batches(self):
+        measurements = []
+        generator = RankedHandsGenerator(
+            instrumentation=Instrumentation(callbacks=[measurements.append])
+        )
+        categories = RankedHandsGenerator.CATEGORIES[:3]
+        with mock.patch.object(RankedHandsGenerator, "CATEGORIES", categories):
+            with mock.patch.object(
+                Hand.objects, "bulk_create", wraps=Hand.objects.bulk_create
+            ) as bulk_create:
+                with self.assertLogs("hand_ranker", "INFO"):
+                    total = generator.stream_hands_to_db(batch_size=1000)
+        self.assertEqual(total, 40 + 624 + 3744)
+        self.assertEqual(
+            [len(call.args[0]) for call in bulk_create.call_args_list],
+            [40, 624, 1000, 1000, 1000, 744],
+        )
+        self.assertEqual(
+            [(m.name, m.objects) for m in measurements if m.kind == "category"],
+            [(label, size) for label, _, size in categories],
+        )
+        self.assertEqual(generator.current_rank, evaluator.MAX_RANK - total)
+        expected = [
+            (hand.card_mask, hand.rank)
+            for unit in strongest_units()
+            for hand in generate_unit(*unit)
+        ]
+        self.assertEqual(
+            list(Hand.objects.order_by("id").values_list("card_mask", "rank")),
+            expected,
+        )
+
+
+class SeedHandsTests(TransactionTestCase):
+    """`seed_hands` over the first three categories, which it loads like
+    the full table."""
+
+    def tearDown(self):
+        reset_card_registry()
+
+    def seed(self, *args) -> str:
+        stdout = io.StringIO()
+        categories = RankedHandsGenerator.CATEGORIES[:3]
+        with mock.patch.object(
+            RankedHandsGenerator, "CATEGORIES", categories
+        ), mock.patch.object(RankedHandsGenerator, "MAX_RANK", 4408):
+            # loading logs each category, skipping logs nothing
+            with mock.patch.object(
+                logging.getLogger("hand_ranker.instrumentation"),
+                "disabled",
+                True,
+            ):
+                call_command("seed_hands", *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def indexes(self, table: str) -> list[tuple[str, str]]:
+        with connection.cursor() as cursor:
+            return cursor.execute(
+                "SELECT name, sql FROM sqlite_master "
+                "WHERE type = 'index' AND tbl_name = %s ORDER BY name",
+                [table],
+            ).fetchall()
+
+    def test_seed(self):
+        indexes = self.indexes(Hand._meta.db_table)
+        # explicit indexes, which seeding drops and rebuilds
+        self.assertTrue(any(sql for _, sql in indexes))
+        self.assertIn("Seeded 4408 rows", self.seed())
+        self.assertEqual(self.indexes(Hand._meta.db_table), indexes)
+        rows = sorted(Hand.objects.values_list("card_mask", "rank"))
+        self.assertEqual(len(rows), 4408)
+
+        # a complete table is left alone unless forced
+        first_id = Hand.objects.order_by("id").first().id
+        self.assertIn("already holds 4408 rows", self.seed())
+        self.assertEqual(Hand.objects.order_by("id").first().id, first_id)
+        self.assertIn("Seeded 4408 rows", self.seed("--force"))
+        self.assertNotEqual(Hand.objects.order_by("id").first().id, first_id)
+        self.assertEqual(
+            sorted(Hand.objects.values_list("card_mask", "rank")), rows
+        )
+        self.assertEqual(self.indexes(Hand._meta.db_table), indexes)
+
+        with connection.cursor() as cursor:
+            journal_mode = cursor.execute("PRAGMA journal_mode").fetchone()
+            self.assertNotEqual(journal_mode[0].upper(), "OFF")
 
-# Create your tests here.
+    def test_seed_classes(self):
+        self.assertIn("Seeded 7462 rows", self.seed("--classes"))
+        self.assertEqual(
+            list(HandClass.objects.order_by("-rank")),
+            [
+                HandClass.from_strength(strength)
+                for strength in evaluator.strength_classes()
+            ],
+        )
@@ -0,0 +1,11 @@
+from django.urls import path
+
+from . import views
+
+app_name = "hand_ranker"
+
+urlpatterns = [
+    path("evaluate/", views.evaluate, name="evaluate"),
+    path("evaluate/async/", views.evaluate_async, name="evaluate_async"),
+    path("equity/", views.equity_view, name="equity"),
+]
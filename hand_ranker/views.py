@@ -1,3 +1,218 @@
-from django.shortcuts import render
+import asyncio
+import json
+import os
+from collections.abc import AsyncIterator
+from concurrent.futures import ProcessPoolExecutor
 
-# Create your views here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpRequest
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
+from django.http import JsonResponse
+from django.http import StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+import equity
+
+from . import evaluator
+from . import metrics as request_metrics
+from .cache import equity_cache
+from .cache import equity_key
+from .cards import parse_cards
+from .models import card_registry
+
+MAX_BATCH_SIZE = 10_000
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def parse_hands(body: bytes) -> list[list[int]]:
+    """Read `{"hands": ["As Kd Qh Jc Ts", ...]}` into lists of card codes,
+    5 or 7 distinct cards each."""
+    try:
+        hands = json.loads(body)["hands"]
+    except (ValueError, TypeError, KeyError):
+        raise BadRequest('Expected a JSON object with a "hands" list') from None
+    if not isinstance(hands, list) or not hands:
+        raise BadRequest('"hands" must be a non-empty list')
+    if len(hands) > MAX_BATCH_SIZE:
+        raise BadRequest(f"At most {MAX_BATCH_SIZE} hands per request")
+    parsed = []
+    for i, hand in enumerate(hands):
+        if not isinstance(hand, str):
+            raise BadRequest(f"Hand {i} is not a string")
+        try:
+            cards = parse_cards(hand)
+        except ValueError as error:
+            raise BadRequest(f"Hand {i}: {error}") from None
+        if len(cards) not in (5, 7) or len(set(cards)) != len(cards):
+            raise BadRequest(f"Hand {i} needs 5 or 7 distinct cards")
+        parsed.append(cards)
+    return parsed
+
+
+def rank_hands(hands: list[list[int]]) -> list[dict]:
+    """Rank each hand with the in-memory evaluator. A 7-card hand gets the
+    rank of its best 5 cards, and every hand with the batch's highest rank
+    is a winner."""
+    ranks = [
+        (
+            evaluator.evaluate(cards)
+            if len(cards) == 5
+            else evaluator.evaluate_best(cards)
+        )
+        for cards in hands
+    ]
+    best = max(ranks)
+    return [
+        {
+            "rank": rank,
+            "hand_type": evaluator.hand_type(rank).label,
+            "winner": rank == best,
+        }
+        for rank in ranks
+    ]
+
+
+@csrf_exempt
+@require_POST
+def evaluate(request: HttpRequest) -> JsonResponse:
+    try:
+        hands = parse_hands(request.body)
+    except BadRequest as error:
+        return JsonResponse({"error": str(error)}, status=400)
+    return JsonResponse({"results": rank_hands(hands)})
+
+
+_executor: ProcessPoolExecutor | None = None
+
+
+def _start_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # forked workers inherit the card registry and the 7-card tables
+        card_registry()
+        evaluator.warm_up()
+        _executor = ProcessPoolExecutor(
+            settings.HAND_RANKER_WORKERS, initializer=equity.init_worker
+        )
+    return _executor
+
+
+async def executor() -> ProcessPoolExecutor:
+    """The process pool shared by the async views, started on first use
+    with `settings.HAND_RANKER_WORKERS` workers."""
+    if _executor is None:
+        return await sync_to_async(_start_executor)()
+    return _executor
+
+
+def workers() -> int:
+    return settings.HAND_RANKER_WORKERS or os.cpu_count() or 1
+
+
+@csrf_exempt
+@require_POST
+async def evaluate_async(request: HttpRequest) -> JsonResponse:
+    """`evaluate`, with the ranking done in the shared process pool. If the
+    client disconnects, Django cancels the view and with it the job, unless
+    a worker has already picked it up."""
+    try:
+        hands = parse_hands(request.body)
+    except BadRequest as error:
+        return JsonResponse({"error": str(error)}, status=400)
+    loop = asyncio.get_running_loop()
+    results = await loop.run_in_executor(await executor(), rank_hands, hands)
+    return JsonResponse({"results": results})
+
+
+EQUITY_OPTIONS = {
+    "target_stderr": float,
+    "time_budget": float,
+    "max_rollouts": int,
+    "seed": int,
+}
+MAX_TIME_BUDGET = 30.0
+
+
+def parse_equity_request(body: bytes) -> tuple[list, list, bool, dict]:
+    """Read `{"hands": ["As Kd", "Qs Qh"], "board": "2h 7h Qc"}` plus
+    optional "exact" and Monte Carlo options into card codes."""
+    try:
+        data = json.loads(body)
+        hands = [parse_cards(hand) for hand in data["hands"]]
+        board = parse_cards(data.get("board", ""))
+        options = {
+            name: cast(data[name])
+            for name, cast in EQUITY_OPTIONS.items()
+            if name in data
+        }
+    except (ValueError, TypeError, KeyError, AttributeError):
+        raise BadRequest(
+            'Expected a JSON object with a "hands" list of hole cards, and '
+            'optionally a "board", "exact" and numeric sampling options'
+        ) from None
+    options["time_budget"] = min(
+        options.get("time_budget", equity.TIME_BUDGET), MAX_TIME_BUDGET
+    )
+    max_rollouts = options.get("max_rollouts", equity.MAX_ROLLOUTS)
+    options["max_rollouts"] = max(1, min(max_rollouts, equity.MAX_ROLLOUTS))
+    exact = bool(data.get("exact"))
+    if exact and len(board) < 3:
+        raise BadRequest("Exact equity needs at least the flop")
+    return hands, board, exact, options
+
+
+@csrf_exempt
+@require_POST
+async def equity_view(request: HttpRequest) -> HttpResponse:
+    """Stream each player's equity as newline-delimited JSON: one running
+    Monte Carlo estimate per wave of batches, the last one final, or a
+    single exact or cached result. A client that disconnects cancels the
+    stream and the batches still queued for it."""
+    # card codes come from the database the first time
+    await sync_to_async(card_registry)()
+    try:
+        hands, board, exact, options = parse_equity_request(request.body)
+        equity.live_cards(hands, board)
+    except ValueError as error:
+        return JsonResponse({"error": str(error)}, status=400)
+
+    key = equity_key(hands, board, exact, options)
+
+    async def stream() -> AsyncIterator[str]:
+        result = await equity_cache.aget(key)
+        if result is not None:
+            yield json.dumps(result.as_dict()) + "\n"
+            return
+        if exact:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(
+                await executor(), equity.exact_equity, hands, board
+            )
+            yield json.dumps(result.as_dict()) + "\n"
+        else:
+            async for result in equity.aiter_monte_carlo(
+                hands, board, await executor(), workers(), **options
+            ):
+                yield json.dumps(result.as_dict()) + "\n"
+        # only reached once the final result has been sent
+        await equity_cache.aset(key, result)
+
+    return StreamingHttpResponse(stream(), content_type="application/x-ndjson")
+
+
+def metrics(request: HttpRequest) -> HttpResponse:
+    """Per-endpoint request metrics and result cache statistics in
+    Prometheus' text format, for clients in
+    `settings.HAND_RANKER_METRICS_IPS` only."""
+    if request.META.get("REMOTE_ADDR") not in settings.HAND_RANKER_METRICS_IPS:
+        raise PermissionDenied
+    text = request_metrics.registry.render(
+        {equity_cache.name: equity_cache.stats()}
+    )
+    return HttpResponse(text, content_type="text/plain; version=0.0.4")
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "poker.settings")
 
 application = get_asgi_application()
+
+# so the first request for a 7-card hand does not build the tables
+from hand_ranker import evaluator  # noqa: E402
+
+evaluator.warm_up()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +44,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "hand_ranker.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -124,3 +126,40 @@ STATIC_URL = "static/"
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Hand ranker
+
+# Memory-mapped rank table written by `manage.py build_rank_table`
+HAND_RANK_TABLE = BASE_DIR / "hand_ranks.bin"
+
+# Where `Hand.objects.lookup` finds ranks: "hands" for the Hand table, or
+# "classes" for the much smaller HandClass table seeded by
+# `manage.py seed_hands --classes`
+HAND_RANKER_HAND_STORE = "hands"
+
+# Process pool size for the async views (None for one per CPU)
+HAND_RANKER_WORKERS = None
+
+# Entries kept per process by each of the `hand_ranker.cache` LRU caches
+HAND_RANKER_CACHE_SIZE = 10_000
+
+# Django cache alias shared by all workers, or None for per-process only
+HAND_RANKER_CACHE_BACKEND = None
+
+# Clients allowed to read the request metrics served at /metrics
+HAND_RANKER_METRICS_IPS = ("127.0.0.1", "::1")
+
+# Generation progress and timings from `hand_ranker.instrumentation`
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "hand_ranker": {
+            "handlers": ["console"],
+            "level": os.environ.get("HAND_RANKER_LOG_LEVEL", "INFO"),
+        },
+    },
+}
@@ -14,9 +14,15 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+
 from django.contrib import admin
+from django.urls import include
 from django.urls import path
 
+from hand_ranker import views as hand_ranker_views
+
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("hands/", include("hand_ranker.urls")),
+    path("metrics", hand_ranker_views.metrics, name="metrics"),
 ]
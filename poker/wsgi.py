@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "poker.settings")
 
 application = get_wsgi_application()
+
+# so the first request for a 7-card hand does not build the tables
+from hand_ranker import evaluator  # noqa: E402
+
+evaluator.warm_up()